@@ -13,4 +13,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from uts import live  # noqa: E402 (needs the apps to be loaded)
+
+
+async def application(scope, receive, send):
+    if live.matches(scope):
+        return await live.application(scope, receive, send)
+    return await django_application(scope, receive, send)
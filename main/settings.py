@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from kombu import Queue
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -33,7 +35,93 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-CELERY_BROKER_URL = f"redis://{os.environ.get('REDIS_HOST', 'localhost')}"
+REDIS_URL = f"redis://{os.environ.get('REDIS_HOST', 'localhost')}"
+
+CELERY_BROKER_URL = REDIS_URL
+
+# Workers started without -Q consume all of these; a dedicated worker can take only e.g. sandbox-heavy.
+CELERY_TASK_QUEUES = [Queue('celery'), Queue('sandbox-light'), Queue('sandbox-heavy')]
+
+# Fair-share scheduler between uploads and workers (uts.scheduler). 0 sends every run straight to Celery.
+SCHEDULER_ENABLED = int(os.environ.get('SCHEDULER_ENABLED', 1))
+# Runs in flight per cost class.
+SCHEDULER_SLOTS = {
+    'light': int(os.environ.get('SCHEDULER_LIGHT_SLOTS', 8)),
+    'heavy': int(os.environ.get('SCHEDULER_HEAVY_SLOTS', 2)),
+}
+# Tasks with cpu_limit (s) * memory_limit (MB) at or above this are heavy.
+SCHEDULER_HEAVY_COST = int(os.environ.get('SCHEDULER_HEAVY_COST', 512))
+SCHEDULER_STUDENT_IN_FLIGHT = int(os.environ.get('SCHEDULER_STUDENT_IN_FLIGHT', 1))
+# A run that has not finished after this many seconds is considered lost and frees its slot.
+SCHEDULER_JOB_TIMEOUT = int(os.environ.get('SCHEDULER_JOB_TIMEOUT', 600))
+# Seconds a new solution waits before it is queued; a re-upload within them replaces it without a run.
+UPLOAD_DEBOUNCE = int(os.environ.get('UPLOAD_DEBOUNCE', 3))
+
+# Admission of sandbox runs by the resources of the worker host (uts.admission), 0 runs them as they come.
+ADMISSION_ENABLED = int(os.environ.get('ADMISSION_ENABLED', 1))
+# Cores and MB of memory sandbox runs of a host may reserve, 0 takes all cores and 80% of the physical memory.
+ADMISSION_CPUS = int(os.environ.get('ADMISSION_CPUS', 0))
+ADMISSION_MEMORY = int(os.environ.get('ADMISSION_MEMORY', 0))
+# Name of the host the reservations are counted for; workers in containers of one host should share it.
+ADMISSION_HOST = os.environ.get('ADMISSION_HOST', '')
+# Seconds after which a waiting run is no longer overtaken by smaller ones.
+ADMISSION_BYPASS = int(os.environ.get('ADMISSION_BYPASS', 30))
+
+# Pre-started sandbox containers per Environment.docker_image in every worker process.
+# SANDBOX_POOL_MAX_SIZE=0 disables the pool and runs every solution in a fresh container.
+SANDBOX_POOL_MIN_SIZE = int(os.environ.get('SANDBOX_POOL_MIN_SIZE', 1))
+SANDBOX_POOL_MAX_SIZE = int(os.environ.get('SANDBOX_POOL_MAX_SIZE', 4))
+
+# Run local sandbox processes in their own network namespace; needs unprivileged user namespaces on the worker,
+# without them the runs fail. 0 lets solutions use the network of the worker, including Redis and the database.
+LOCAL_SANDBOX_ISOLATE_NETWORK = int(os.environ.get('LOCAL_SANDBOX_ISOLATE_NETWORK', 1))
+# A worker running as root starts local sandbox runs as uid (and gid) this plus its pid; the range must be unused.
+LOCAL_SANDBOX_UID_BASE = int(os.environ.get('LOCAL_SANDBOX_UID_BASE', 1000000))
+
+# Bytes of stdout and stderr kept from a single run; anything above is discarded.
+SANDBOX_OUTPUT_CAPTURE_LIMIT = int(os.environ.get('SANDBOX_OUTPUT_CAPTURE_LIMIT', 10 * 1024 * 1024))
+# Characters of each stream stored in Solution.log (head and tail), the full output goes to a gzip file.
+SOLUTION_LOG_OUTPUT_LIMIT = int(os.environ.get('SOLUTION_LOG_OUTPUT_LIMIT', 16 * 1024))
+# Characters of sandbox output streamed live to the solution page.
+LIVE_OUTPUT_LIMIT = int(os.environ.get('LIVE_OUTPUT_LIMIT', 64 * 1024))
+# Path of the live streams of solutions, served by the ASGI app; nginx sends /live/ to it.
+LIVE_URL_PREFIX = os.environ.get('LIVE_URL_PREFIX', '/live/solutions/')
+# Seconds between keepalive comments of an idle live stream.
+LIVE_KEEPALIVE = int(os.environ.get('LIVE_KEEPALIVE', 15))
+
+# Bytes of test files kept in memory by every worker process, 0 disables the cache.
+TEST_FILE_CACHE_SIZE = int(os.environ.get('TEST_FILE_CACHE_SIZE', 64 * 1024 * 1024))
+
+# Maximum number of cached sandbox results (least recently used are evicted), 0 disables the cache.
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 10000))
+
+# Bearer token required by the /metrics endpoints, empty to leave them open (nginx does not proxy /metrics).
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Port of the /metrics endpoint of a Celery worker, 0 disables it. It serves the same Redis-wide
+# metrics as the web app, for deployments without one; scrape only one of them.
+WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 0))
+
+# Solutions inserted and enqueued at once when loading an archive, and the largest file taken from it.
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+INGEST_MAX_FILE_SIZE = int(os.environ.get('INGEST_MAX_FILE_SIZE', 10 * 1024 * 1024))
+
+# Limits of the build phase of environments with a build command, and the number of cached build results.
+BUILD_CPU_LIMIT = int(os.environ.get('BUILD_CPU_LIMIT', 60))
+BUILD_MEMORY_LIMIT = int(os.environ.get('BUILD_MEMORY_LIMIT', 512))
+BUILD_CACHE_SIZE = int(os.environ.get('BUILD_CACHE_SIZE', 10000))
+
+# Similarity of solutions from which they are reported as similar, and the rows of the per-task similarity report.
+SIMILARITY_THRESHOLD = float(os.environ.get('SIMILARITY_THRESHOLD', 0.5))
+SIMILARITY_REPORT_LIMIT = int(os.environ.get('SIMILARITY_REPORT_LIMIT', 500))
+
+# Seconds a rendered task page of a student is kept in Redis, 0 disables the cache.
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+
+# Admin lists count at most this many rows, larger totals are shown as estimates.
+ADMIN_COUNT_LIMIT = int(os.environ.get('ADMIN_COUNT_LIMIT', 10000))
+
+# How many solutions of one regrade may run at the same time.
+REGRADE_CONCURRENCY = int(os.environ.get('REGRADE_CONCURRENCY', 4))
 
 ROOT_URLCONF = 'uts.urls'
 
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import testrunner
+
+
+def check(mode, expected, chunks, **options):
+    comparator = testrunner.make_comparator({'mode': mode, 'expected_result': expected, **options})
+    for chunk in chunks:
+        comparator.feed(chunk)
+    return comparator.finish()
+
+
+class EqualsComparatorTests(unittest.TestCase):
+    def test_equal_output_passes_in_any_chunks(self):
+        self.assertIsNone(check('equals', 'hello\nworld\n', ['hel', 'lo\nwo', 'rld\n']))
+
+    def test_difference_is_located(self):
+        self.assertEqual(
+            check('equals', 'ab\ncd\n', ['ab\nxd\n']), "line 2, column 1: expected 'cd\\n', got 'xd\\n'",
+        )
+
+    def test_short_output_fails(self):
+        self.assertIsNotNone(check('equals', 'abc', ['ab']))
+
+    def test_strip_ignores_surrounding_whitespace(self):
+        self.assertIsNone(check('equals', 'abc', ['\n  a', 'bc  ', '\n\n'], strip=True))
+        self.assertIsNotNone(check('equals', 'abc', ['abc  ', 'd'], strip=True))
+
+    def test_mismatch_is_known_before_the_end(self):
+        comparator = testrunner.make_comparator({'mode': 'equals', 'expected_result': 'abc'})
+        comparator.feed('ax')
+        self.assertTrue(comparator.decided)
+
+
+class ContainsComparatorTests(unittest.TestCase):
+    def test_text_split_between_chunks_is_found(self):
+        self.assertIsNone(check('contains', 'needle', ['hay nee', 'dle hay']))
+
+    def test_missing_text_fails(self):
+        self.assertEqual(check('contains', 'needle', ['hay', 'stack']), "expected text 'needle' not found")
+
+    def test_decided_once_found(self):
+        comparator = testrunner.make_comparator({'mode': 'contains', 'expected_result': 'needle'})
+        comparator.feed('hay')
+        self.assertFalse(comparator.decided)
+        comparator.feed(' needle')
+        self.assertTrue(comparator.decided)
+
+
+class RegexComparatorTests(unittest.TestCase):
+    def test_whole_output_is_matched(self):
+        self.assertIsNone(check('regex', r'\d+ items\n', ['12', ' items\n']))
+        self.assertIsNotNone(check('regex', r'\d+$', ['abc']))
+
+
+class TokensComparatorTests(unittest.TestCase):
+    def test_whitespace_does_not_matter(self):
+        self.assertIsNone(check('tokens', '1 2\n3', ['1\n', ' 2   ', '3\n\n']))
+
+    def test_token_split_between_chunks(self):
+        self.assertIsNone(check('tokens', 'hello world', ['hel', 'lo wor', 'ld']))
+
+    def test_extra_and_missing_tokens_fail(self):
+        self.assertIn('unexpected token', check('tokens', '1 2', ['1 2 3']))
+        self.assertIn('output ended at token 3', check('tokens', '1 2 3', ['1 2']))
+
+    def test_float_tolerance(self):
+        self.assertIsNone(check('tokens', '0.333', ['0.3334'], float_tolerance=0.001))
+        self.assertIsNotNone(check('tokens', '0.333', ['0.34'], float_tolerance=0.001))
+        self.assertIsNotNone(check('tokens', '0.333', ['0.3334']))
+
+
+class LinesComparatorTests(unittest.TestCase):
+    def test_trailing_whitespace_and_empty_lines_are_ignored(self):
+        self.assertIsNone(check('lines', 'a\nb', ['a  \n', 'b\n', '\n\n']))
+
+    def test_blank_line_in_the_middle_counts(self):
+        self.assertEqual(check('lines', 'a\nb', ['a\n\nb\n']), "line 2: expected 'b', got ''")
+
+    def test_missing_line_fails(self):
+        self.assertEqual(check('lines', 'a\nb', ['a\n']), "output ended at line 2, expected 'b'")
+
+    def test_empty_expected_output(self):
+        self.assertIsNone(check('lines', '', []))
+        self.assertIsNone(check('lines', '\n', ['  \n']))
+        self.assertEqual(check('lines', '', ['a\n']), "line 1: expected end of output, got 'a'")
+
+
+class UnorderedLinesComparatorTests(unittest.TestCase):
+    def test_any_order_passes(self):
+        self.assertIsNone(check('unordered_lines', 'a\nb\nb', ['b\na', '\nb\n']))
+
+    def test_unexpected_and_missing_lines_fail(self):
+        self.assertIn('unexpected line', check('unordered_lines', 'a\nb', ['a\nc\n']))
+        self.assertIn('missing 1 line(s)', check('unordered_lines', 'a\nb', ['a\n']))
+
+
+class ExecuteTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        self.addCleanup(os.chdir, cwd)
+
+    def solution(self, script):
+        with open('solution', 'w') as f:
+            f.write('#!/bin/sh\n' + script)
+        os.chmod('solution', 0o755)
+
+    def test_contains_stops_reading_once_found(self):
+        self.solution('echo needle; yes')
+        test = {'mode': 'contains', 'expected_result': 'needle', 'stdin': ''}
+        comparator = testrunner.make_comparator(test)
+        started_at = time.monotonic()
+        status, _, size = testrunner.execute(test, 10, 64 * 1024, comparator, 0)
+        self.assertIsNone(status)
+        self.assertIsNone(comparator.finish())
+        self.assertLess(size, 64 * 1024 + 65536)
+        self.assertLess(time.monotonic() - started_at, 5)
+
+    def test_output_limit(self):
+        self.solution('yes')
+        test = {'mode': 'equals', 'expected_result': 'y\n' * 100000, 'stdin': ''}
+        status, _, _ = testrunner.execute(test, 10, 1024, testrunner.make_comparator(test), 0)
+        self.assertEqual(status, testrunner.OUTPUT_LIMIT)
+
+
+if __name__ == '__main__':
+    unittest.main()
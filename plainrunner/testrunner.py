@@ -1,40 +1,454 @@
-import subprocess
+import argparse
+import codecs
 import json
+import os
+import re
+import select
+import signal
+import subprocess
 import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+SUMMARY_MARKER = '##uts-summary##'
+
+PASSED = 'passed'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+OUTPUT_LIMIT = 'output_limit'
+SKIPPED = 'skipped'
+
+# The sandbox pid limit counts threads too: every parallel test takes a worker
+# thread, a stdin feeder thread and the solution process itself
+MAX_DEFAULT_WORKERS = 3
+
+TOKEN = re.compile(r'\S+|\n')
+SNIPPET_LENGTH = 40
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--parallel', action='store_true', help='Run tests concurrently')
+    parser.add_argument('--workers', type=int, default=None, help='Worker count in parallel mode')
+    parser.add_argument('--timeout', type=float, default=None, help='Wall-clock limit of a single test, seconds')
+    parser.add_argument('--max-output', type=int, default=None, help='Stdout limit of a single test, bytes')
+    parser.add_argument('--fail-fast', action='store_true', help='Skip remaining tests after the first failure')
+    parser.add_argument('--show-output', type=int, default=4096, help='Stdout bytes of a test printed to the log')
+    return parser.parse_args()
+
+
+def available_cpus():
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return min(cpus, MAX_DEFAULT_WORKERS)
+
+
+def _position(text, offset):
+    line = text.count('\n', 0, offset) + 1
+    return line, offset - (text.rfind('\n', 0, offset) + 1) + 1
+
+
+def _snippet(text):
+    return repr(text[:SNIPPET_LENGTH] + ('...' if len(text) > SNIPPET_LENGTH else ''))
+
+
+class Comparator:
+    """Checks the stdout of a test while it is read, chunk by chunk.
+
+    ``mismatch`` becomes the description of the first difference as soon as
+    it is known, and ``decided`` turns true once the rest of the output can
+    no longer change the verdict, so the solution can be stopped without
+    reading the rest.
+    """
+
+    def __init__(self, test):
+        self.expected = test['expected_result']
+        self.strip = test.get('strip', False)
+        assert self.strip is True or self.strip is False, 'strip should be True or False'
+        self.mismatch = None
+
+    def feed(self, text):
+        pass
+
+    @property
+    def decided(self):
+        return self.mismatch is not None
+
+    def finish(self):
+        """Returns None if the output is correct, the first difference otherwise."""
+        return self.mismatch
+
+
+class EqualsComparator(Comparator):
+    def __init__(self, test):
+        super().__init__(test)
+        if self.strip:
+            self.expected = self.expected.strip()
+        self.offset = 0
+        self.started = not self.strip
+        self.whitespace = ''
+
+    def feed(self, text):
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        if self.strip:
+            # Trailing whitespace is compared only once something follows it
+            text = self.whitespace + text
+            stripped = text.rstrip()
+            self.whitespace = text[len(stripped):]
+            text = stripped
+        self._compare(text)
+
+    def _compare(self, text):
+        if self.mismatch is not None or not text:
+            return
+        expected = self.expected[self.offset:self.offset + len(text)]
+        if text == expected:
+            self.offset += len(text)
+            return
+        for i, (a, b) in enumerate(zip(text, expected)):
+            if a != b:
+                self._fail(self.offset + i, text[i:])
+                return
+        if len(text) > len(expected):
+            self._fail(self.offset + len(expected), text[len(expected):])
+            return
+        self.offset += len(text)
+
+    def _fail(self, offset, actual):
+        line, column = _position(self.expected, offset)
+        self.mismatch = (
+            f'line {line}, column {column}: expected {_snippet(self.expected[offset:])}, got {_snippet(actual)}'
+        )
+
+    def finish(self):
+        if self.mismatch is None and self.offset < len(self.expected):
+            self._fail(self.offset, '')
+        return self.mismatch
+
+
+class ContainsComparator(Comparator):
+    def __init__(self, test):
+        super().__init__(test)
+        self.tail = ''
+        self.found = False
+
+    def feed(self, text):
+        if self.found:
+            return
+        window = self.tail + text
+        self.found = self.expected in window
+        # Enough of the end to find the expected text split between chunks
+        self.tail = window[-(len(self.expected) - 1):] if len(self.expected) > 1 else ''
+
+    @property
+    def decided(self):
+        return self.found
+
+    def finish(self):
+        if not self.found:
+            self.mismatch = f'expected text {_snippet(self.expected)} not found'
+        return self.mismatch
+
+
+class RegexComparator(Comparator):
+    """A regular expression needs the whole output, it is kept up to --max-output."""
+
+    def __init__(self, test):
+        super().__init__(test)
+        self.pattern = re.compile(self.expected)
+        self.chunks = []
+
+    def feed(self, text):
+        self.chunks.append(text)
+
+    def finish(self):
+        stdout = ''.join(self.chunks)
+        if self.strip:
+            stdout = stdout.strip()
+        if not self.pattern.match(stdout):
+            self.mismatch = 'output does not match the regular expression'
+        return self.mismatch
+
+
+class SplitComparator(Comparator):
+    """Compares complete items (tokens or lines), holding back the unfinished last one."""
+
+    separator = None
+
+    def __init__(self, test):
+        super().__init__(test)
+        self.carry = ''
+        self.line = 1
+
+    def feed(self, text):
+        if self.mismatch is not None:
+            return
+        text = self.carry + text
+        end = max(text.rfind(char) for char in self.separator) + 1
+        self.carry = text[end:]
+        self._items(text[:end])
+
+    def finish(self):
+        if self.mismatch is None:
+            self._items(self.carry + self.separator[0])
+        if self.mismatch is None:
+            self._end()
+        return self.mismatch
+
+    def _items(self, text):
+        raise NotImplementedError
+
+    def _end(self):
+        raise NotImplementedError
+
+
+class TokensComparator(SplitComparator):
+    """Whitespace-separated tokens; numbers may differ by float_tolerance, absolute or relative."""
+
+    separator = '\n \t\r\f\v'
+
+    def __init__(self, test):
+        super().__init__(test)
+        self.tolerance = test.get('float_tolerance')
+        self.tokens = self.expected.split()
+        self.index = 0
+
+    def _items(self, text):
+        for match in TOKEN.finditer(text):
+            if match.group() == '\n':
+                self.line += 1
+                continue
+            actual = match.group()
+            if self.index >= len(self.tokens):
+                self.mismatch = f'line {self.line}: unexpected token {_snippet(actual)} after the expected output'
+                return
+            expected = self.tokens[self.index]
+            if not self._equal(expected, actual):
+                self.mismatch = (
+                    f'line {self.line}, token {self.index + 1}: expected {_snippet(expected)}, got {_snippet(actual)}'
+                )
+                return
+            self.index += 1
+
+    def _equal(self, expected, actual):
+        if expected == actual:
+            return True
+        if self.tolerance is None:
+            return False
+        try:
+            a, b = float(actual), float(expected)
+        except ValueError:
+            return False
+        return abs(a - b) <= self.tolerance or abs(a - b) <= self.tolerance * abs(b)
+
+    def _end(self):
+        if self.index < len(self.tokens):
+            self.mismatch = (
+                f'output ended at token {self.index + 1}, expected {_snippet(self.tokens[self.index])}'
+            )
+
+
+class LinesComparator(SplitComparator):
+    """Lines in order, trailing whitespace and trailing empty lines are ignored."""
+
+    separator = '\n'
+
+    def __init__(self, test):
+        super().__init__(test)
+        # An empty expected text is no lines, not a single empty one
+        self.lines = [line.rstrip() for line in self.expected.rstrip().split('\n')] if self.expected.strip() else []
+        self.blank = 0
+
+    def _items(self, text):
+        for line in text.split('\n')[:-1]:
+            line = line.rstrip()
+            if not line:
+                # Blank lines count only if something follows them
+                self.blank += 1
+                continue
+            for _ in range(self.blank):
+                if not self._match(''):
+                    return
+            self.blank = 0
+            if not self._match(line):
+                return
+
+    def _match(self, actual):
+        index = self.line - 1
+        expected = self.lines[index] if index < len(self.lines) else None
+        if actual != expected:
+            expected = 'end of output' if expected is None else _snippet(expected)
+            self.mismatch = f'line {self.line}: expected {expected}, got {_snippet(actual)}'
+            return False
+        self.line += 1
+        return True
+
+    def _end(self):
+        if self.line - 1 < len(self.lines):
+            self.mismatch = f'output ended at line {self.line}, expected {_snippet(self.lines[self.line - 1])}'
+
+
+class UnorderedLinesComparator(SplitComparator):
+    """The same lines in any order; blank lines and trailing whitespace are ignored."""
+
+    separator = '\n'
+
+    def __init__(self, test):
+        super().__init__(test)
+        self.remaining = Counter(line.rstrip() for line in self.expected.split('\n') if line.strip())
+
+    def _items(self, text):
+        for line in text.split('\n')[:-1]:
+            line = line.rstrip()
+            if line:
+                if not self.remaining[line]:
+                    self.mismatch = f'line {self.line}: unexpected line {_snippet(line)}'
+                    return
+                self.remaining[line] -= 1
+            self.line += 1
+
+    def _end(self):
+        missing = +self.remaining
+        if missing:
+            self.mismatch = f'missing {sum(missing.values())} line(s), e.g. {_snippet(next(iter(missing)))}'
+
+
+COMPARATORS = {
+    'equals': EqualsComparator,
+    'contains': ContainsComparator,
+    'regex': RegexComparator,
+    'tokens': TokensComparator,
+    'lines': LinesComparator,
+    'unordered_lines': UnorderedLinesComparator,
+}
+
+
+def make_comparator(test):
+    mode = test['mode']
+    assert mode in COMPARATORS, f'Mode should be one of: {", ".join(COMPARATORS)}'
+    return COMPARATORS[mode](test)
+
+
+def execute(test, timeout, max_output, comparator, show_output):
+    # A separate process group lets us kill whatever the solution has spawned
+    proc = subprocess.Popen(
+        ['./solution'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True
+    )
+
+    def kill_group():
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def feed():
+        try:
+            proc.stdin.write(test['stdin'].encode('utf8'))
+            proc.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    threading.Thread(target=feed, daemon=True).start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    fd = proc.stdout.fileno()
+    decoder = codecs.getincrementaldecoder('utf8')(errors='replace')
+    shown = bytearray()
+    size = 0
+    status = None
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            kill_group()
+            status = TIMEOUT
+            break
+        if not select.select([fd], [], [], remaining)[0]:
+            continue
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            comparator.feed(decoder.decode(b'', final=True))
+            break
+        if len(shown) < show_output:
+            shown += chunk[:show_output - len(shown)]
+        size += len(chunk)
+        comparator.feed(decoder.decode(chunk))
+        if comparator.decided:
+            # The rest of the output does not matter, nor does it count against --max-output
+            kill_group()
+            break
+        if max_output and size > max_output:
+            kill_group()
+            status = OUTPUT_LIMIT
+            break
+    try:
+        proc.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        kill_group()
+        proc.wait()
+        status = TIMEOUT
+    proc.stdout.close()
+    return status, bytes(shown), size
+
+
+def run_test(i, test, args, stop):
+    started_at = time.monotonic()
+    lines = [f'====================\nRunning test #{i + 1}: {test["name"]}...']
+    if stop.is_set():
+        lines.append('Test skipped')
+        return SKIPPED, 0.0, lines
+
+    timeout = test.get('timeout', args.timeout)
+    comparator = make_comparator(test)
+    status, shown, size = execute(test, timeout, args.max_output, comparator, args.show_output)
+    lines.append(f'STDOUT: {shown.decode("utf8", errors="replace")}')
+    if size > len(shown):
+        lines.append(f'... {size - len(shown)} more bytes not shown')
+    if status == TIMEOUT:
+        lines.append(f'Test failed: time limit of {timeout} s exceeded')
+    elif status == OUTPUT_LIMIT:
+        lines.append(f'Test failed: output limit of {args.max_output} bytes exceeded')
+    elif comparator.finish() is None:
+        status = PASSED
+        lines.append('Test passed')
+    else:
+        status = FAILED
+        lines.append(f'Test failed: {comparator.mismatch}')
+
+    if status != PASSED and args.fail_fast:
+        stop.set()
+    return status, time.monotonic() - started_at, lines
 
 
 def run_tests():
-    failed = False
+    args = parse_args()
     subprocess.run(['chmod', '+x', 'solution'])
     with open('tests.json') as f:
         tests = json.loads(f.read())
 
-    for i, test in enumerate(tests):
-        print(f'====================\nRunning test #{i + 1}: {test["name"]}...')
-        expected = test['expected_result']
-        mode = test['mode']
-        assert mode in ('contains', 'equals', 'regex'), 'Mode should be contains, equals or regex'
-        strip = test['strip']
-        assert strip is True or strip is False, 'strip should be True or False'
-        result = subprocess.run(['./solution'], stdout=subprocess.PIPE, input=test['stdin'].encode('utf8'))
-        stdout = result.stdout.decode('utf8')
-        print("STDOUT:", stdout)
-        if strip:
-            stdout = stdout.strip()
-        if mode == 'contains':
-            passed = expected in stdout
-        elif mode == 'equals':
-            passed = stdout == expected
-        elif mode == 'regex':
-            passed = bool(re.match(expected, stdout))
-        else:
-            assert False, 'Unknown test mode'
-        if passed:
-            print('Test passed')
-        else:
-            print('Test failed')
-            failed = True
+    workers = 1
+    if args.parallel:
+        workers = max(1, args.workers or available_cpus())
+    stop = threading.Event()
+
+    summary = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda item: run_test(*item, args, stop), enumerate(tests))
+        for test, (status, duration, lines) in zip(tests, results):
+            print('\n'.join(lines), flush=True)
+            summary.append({'name': test['name'], 'status': status, 'duration': round(duration, 4)})
 
+    failed = any(case['status'] != PASSED for case in summary)
+    print(SUMMARY_MARKER, json.dumps({'cases': summary, 'failed': failed}, ensure_ascii=False))
     sys.exit(failed)
 
 
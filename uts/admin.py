@@ -1,19 +1,25 @@
 from functools import update_wrapper
+from urllib.parse import urlencode
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin import SimpleListFilter
 from django.contrib.admin.utils import unquote
 from django.contrib.auth.admin import UserAdmin
 from django.core.exceptions import PermissionDenied
+from django.db.models import Count
 from django.forms import forms
-from django.http import HttpResponseRedirect
+from django.http import FileResponse, Http404, HttpResponseRedirect, StreamingHttpResponse
 from django.template.response import TemplateResponse
 from django.urls import path, reverse
 from django.utils import timezone
+from django.utils.html import format_html, format_html_join
 from django.utils.text import capfirst
 from django.utils.translation import gettext_lazy as _
-from uts.models import Task, Solution, User, Environment
-from uts.utils import get_student_group
+from uts import admission, gradebook, live, output, page_cache, scheduler, similarity
+from uts.changelist import EstimatedCountPaginator, KeysetChangeList
+from uts.ingest import ArchiveError, ingest_archive
+from uts.models import Task, Solution, User, Environment, Regrade, TestCaseResult, TaskStatus
+from uts.regrade import start_regrade
 
 
 class MyAdminSite(admin.AdminSite):
@@ -22,11 +28,44 @@ class MyAdminSite(admin.AdminSite):
     index_title = ' '
     site_url = None
 
+    index_template = 'uts/admin_index.html'
+
     def app_index(self, request, app_label, extra_context=None):
         response: TemplateResponse = super().app_index(request, app_label, extra_context)
         response.context_data['title'] = None
         return response
 
+    def get_urls(self):
+        return [
+            path('scheduler/', self.admin_view(self.scheduler_view), name='scheduler'),
+            path('gradebook/', self.admin_view(self.gradebook_view), name='gradebook'),
+        ] + super().get_urls()
+
+    def scheduler_view(self, request):
+        if request.user.is_student:
+            raise PermissionDenied
+        context = {
+            **self.each_context(request),
+            'title': 'Очереди проверки',
+            'classes': scheduler.stats(),
+            'hosts': admission.stats(),
+            'page_cache': page_cache.stats(),
+        }
+        return TemplateResponse(request, 'uts/scheduler.html', context)
+
+    def gradebook_view(self, request):
+        if request.user.is_student:
+            raise PermissionDenied
+        task_ids = request.GET.getlist('task')
+        tasks = Task.objects.filter(pk__in=task_ids).order_by('name') if task_ids else None
+        pivot = request.GET.get('layout') == 'pivot'
+        response = StreamingHttpResponse(gradebook.export(tasks, pivot), content_type='text/csv; charset=utf-8')
+        filename = 'gradebook-pivot.csv' if pivot else 'gradebook.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # nginx would otherwise hold the first rows back until its buffer fills
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 
 admin_site = MyAdminSite()
 
@@ -66,20 +105,102 @@ class TaskStateFilter(SimpleListFilter):
         return []
 
     def queryset(self, request, queryset):
+        own = TaskStatus.objects.filter(user=request.user)
+        solved = own.filter(solved=True).values('task_id')
+        checked = own.filter(checked=True).values('task_id')
         if self.value() == self.CHECKED:
-            return queryset.filter(solution__author=request.user, solution__checked=True)
+            return queryset.filter(pk__in=checked)
         if self.value() == self.SOLVED:
-            return queryset.filter(solution__author=request.user, solution__state=Solution.COMPLETED)
+            return queryset.filter(pk__in=solved)
         if self.value() == self.UNSOLVED:
-            return queryset.exclude(solution__author=request.user, solution__state=Solution.COMPLETED)
+            return queryset.exclude(pk__in=solved)
         if self.value() == self.UNCHECKED:
-            return queryset.exclude(solution__author=request.user, solution__checked=True)
+            return queryset.exclude(pk__in=checked)
+
+
+class PrefixFilter(SimpleListFilter):
+    """A text box instead of a list of every value, which would scan the whole table."""
+    template = 'uts/prefix_filter.html'
+    field = None
+
+    def lookups(self, request, model_admin):
+        # Never shown, but a filter without lookups is hidden
+        return (None, None),
+
+    def choices(self, changelist):
+        yield {
+            'query_parts': [
+                (name, value) for name, value in changelist.get_filters_params().items()
+                if name != self.parameter_name
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{f'{self.field}__startswith': self.value()})
+
+
+class AuthorFilter(PrefixFilter):
+    title = 'Автор решения'
+    parameter_name = 'author'
+    field = 'author__username'
+
+
+class TaskNameFilter(PrefixFilter):
+    title = 'Задача'
+    parameter_name = 'task'
+    field = 'task__name'
 
 
 class TaskAdmin(admin.ModelAdmin):
     change_form_template = 'uts/admin_task_student_form.html'
     search_fields = 'name',
     list_filter = TaskStateFilter,
+    actions = 'regrade_solutions', 'regrade_solutions_low_priority', 'export_gradebook', 'export_gradebook_pivot'
+    readonly_fields = 'failing_tests',
+
+    @admin.display(description='Чаще всего проваливаемые тесты')
+    def failing_tests(self, obj: Task):
+        if obj is None:
+            return '-'
+        rows = (
+            TestCaseResult.objects
+            .filter(task=obj)
+            .exclude(status__in=(TestCaseResult.PASSED, TestCaseResult.SKIPPED))
+            .values('name')
+            .annotate(failures=Count('pk'))
+            .order_by('-failures')[:10]
+        )
+        return format_html_join('\n', '<div>{}: {}</div>', ((row['name'], row['failures']) for row in rows)) or '-'
+
+    @admin.action(description='Перепроверить все решения выбранных задач', permissions=['change'])
+    def regrade_solutions(self, request, queryset, low_priority=False):
+        regrade = start_regrade(list(queryset), started_by=request.user, low_priority=low_priority)
+        url = reverse('admin:uts_regrade_change', args=(regrade.pk,))
+        return HttpResponseRedirect(url)
+
+    @admin.action(description='Перепроверить все решения выбранных задач (низкий приоритет)', permissions=['change'])
+    def regrade_solutions_low_priority(self, request, queryset):
+        return self.regrade_solutions(request, queryset, low_priority=True)
+
+    @admin.action(description='Выгрузить результаты решений выбранных задач в CSV', permissions=['change'])
+    def export_gradebook(self, request, queryset, layout='solutions'):
+        query = urlencode([('layout', layout)] + [('task', pk) for pk in queryset.values_list('pk', flat=True)])
+        return HttpResponseRedirect(f'{reverse("admin:gradebook")}?{query}')
+
+    @admin.action(description='Выгрузить ведомость по выбранным задачам в CSV', permissions=['change'])
+    def export_gradebook_pivot(self, request, queryset):
+        return self.export_gradebook(request, queryset, layout='pivot')
+
+    def changelist_view(self, request, extra_context=None):
+        return page_cache.cached(request, lambda: super(TaskAdmin, self).changelist_view(request, extra_context))
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        return page_cache.cached(
+            request,
+            lambda: super(TaskAdmin, self).change_view(request, object_id, form_url, extra_context),
+            task_id=unquote(object_id),
+        )
 
     def render_change_form(self, request, context, add=False, change=False, form_url='', obj=None):
         context.update(dict(is_student=request.user.is_student))
@@ -88,13 +209,16 @@ class TaskAdmin(admin.ModelAdmin):
     def _changeform_view(self, request, object_id, form_url, extra_context):
         if '_upload-solution' in request.POST:
             return HttpResponseRedirect(reverse('admin:upload-solution', args=(object_id,)))
+        if '_upload-archive' in request.POST:
+            return HttpResponseRedirect(reverse('admin:upload-solution-archive', args=(object_id,)))
+        if '_similarity-report' in request.POST:
+            return HttpResponseRedirect(reverse('admin:similarity-report', args=(object_id,)))
         return super()._changeform_view(request, object_id, form_url, extra_context)
 
     def get_fieldsets(self, request, obj=None):
         fieldsets = super().get_fieldsets(request, obj)
-        student_group = get_student_group()
-        if request.user.groups.filter(pk=student_group.pk).count():
-            remove_from_fieldsets(fieldsets, ('tests_file',))
+        if request.user.is_student:
+            remove_from_fieldsets(fieldsets, ('tests_file', 'failing_tests'))
         return fieldsets
 
     def get_urls(self):
@@ -108,6 +232,8 @@ class TaskAdmin(admin.ModelAdmin):
 
         custom_urls = [
             path('<path:object_id>/solution_upload/', wrap(self.solution_upload_view), name='upload-solution'),
+            path('<path:object_id>/archive_upload/', wrap(self.archive_upload_view), name='upload-solution-archive'),
+            path('<path:object_id>/similarity/', wrap(self.similarity_report_view), name='similarity-report'),
         ]
 
         return custom_urls + urls
@@ -159,6 +285,74 @@ class TaskAdmin(admin.ModelAdmin):
 
         return TemplateResponse(request, 'uts/solution_form.html', context)
 
+    def archive_upload_view(self, request, object_id, extra_context=None):
+        model = self.model
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            return self._get_obj_does_not_exist_redirect(request, model._meta, object_id)
+
+        if request.user.is_student or not self.has_change_permission(request, obj):
+            raise PermissionDenied
+
+        opts = model._meta
+
+        class ArchiveUploadForm(forms.Form):
+            file = forms.FileField(
+                label='Архив с решениями',
+                help_text='zip или tar, в том числе сжатый. Путь каждого файла начинается с логина студента: '
+                          'ivanov/main.py или ivanov.py',
+            )
+
+        if request.method == 'POST':
+            form = ArchiveUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                archive = form.cleaned_data['file']
+                try:
+                    report = ingest_archive(obj, archive, archive.name)
+                except ArchiveError as e:
+                    form.add_error('file', str(e))
+                else:
+                    self.message_user(request, f'Загружено решений: {report.created}', messages.SUCCESS)
+                    for member, reason in report.skipped:
+                        self.message_user(request, f'{member}: пропущен, {reason}', messages.WARNING)
+                    return HttpResponseRedirect(reverse('admin:uts_task_change', args=(obj.pk,)))
+        else:
+            form = ArchiveUploadForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Загрузка архива решений для задачи {obj}',
+            'form': form,
+            'module_name': str(capfirst(opts.verbose_name_plural)),
+            'object': obj,
+            'opts': opts,
+            'preserved_filters': self.get_preserved_filters(request),
+            **(extra_context or {}),
+        }
+
+        request.current_app = self.admin_site.name
+
+        return TemplateResponse(request, 'uts/solution_form.html', context)
+
+    def similarity_report_view(self, request, object_id):
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            return self._get_obj_does_not_exist_redirect(request, self.model._meta, object_id)
+
+        if request.user.is_student:
+            raise PermissionDenied
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Похожие решения задачи {obj}',
+            'matches': similarity.report(obj),
+            'opts': self.model._meta,
+        }
+
+        request.current_app = self.admin_site.name
+
+        return TemplateResponse(request, 'uts/similarity_report.html', context)
+
 
 admin_site.register(Task, TaskAdmin)
 
@@ -176,31 +370,145 @@ def remove_from_fieldsets(fieldsets, fields):
                 break
 
 
+class TestCaseResultInline(admin.TabularInline):
+    model = TestCaseResult
+    fields = 'name', 'status', 'duration', 'output'
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 class SolutionAdmin(admin.ModelAdmin):
-    readonly_fields = 'created_at', 'log', 'author', 'task', 'state', 'solution_file'
+    change_form_template = 'uts/solution_change_form.html'
+    readonly_fields = 'created_at', 'log', 'full_log', 'author', 'task', 'state', 'solution_file'
+    exclude = 'log_file',
+    inlines = TestCaseResultInline,
     list_display = '__str__', 'state', 'checked', 'created_at'
+    list_select_related = 'task', 'author'
 
-    list_filter = 'author__username', 'checked', 'state', 'task__name'
+    list_filter = AuthorFilter, 'checked', 'state', TaskNameFilter
 
     ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = 'author__username', 'author__first_name', 'author__last_name', 'task__name'
 
     def has_add_permission(self, request):
         return False
 
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         if request.user.is_student:
             qs = qs.filter(author=request.user)
         return qs
 
+    def render_change_form(self, request, context, add=False, change=False, form_url='', obj=None):
+        if obj is not None and obj.state in (Solution.NEW, Solution.RUNNING):
+            context.update(live_url=live.url(obj.pk))
+        if obj is not None and not request.user.is_student:
+            context.update(similar=[
+                {'solution': match.other if match.solution_id == obj.pk else match.solution, 'similarity': match.similarity}
+                for match in similarity.similar_to(obj)
+            ])
+        return super().render_change_form(request, context, add=add, change=change, form_url=form_url, obj=obj)
+
+    @admin.display(description='Полный лог')
+    def full_log(self, obj: Solution):
+        if not obj.log_file:
+            return '-'
+        url = reverse('admin:solution-log', args=(obj.pk,))
+        return format_html('<a href="{}">Скачать полный лог</a>', url)
+
+    def get_urls(self):
+        urls = super().get_urls()
+
+        def wrap(view):
+            def wrapper(*args, **kwargs):
+                return self.admin_site.admin_view(view)(*args, **kwargs)
+            wrapper.model_admin = self
+            return update_wrapper(wrapper, view)
+
+        custom_urls = [
+            path('<path:object_id>/log/', wrap(self.full_log_view), name='solution-log'),
+        ]
+
+        return custom_urls + urls
+
+    def full_log_view(self, request, object_id):
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None or not obj.log_file:
+            raise Http404
+        return FileResponse(
+            output.open_log(obj.log_file),
+            as_attachment=True,
+            filename=f'solution-{obj.pk}.log',
+            content_type='text/plain; charset=utf-8',
+        )
+
 
 admin_site.register(Solution, SolutionAdmin)
 
 
+class TestCaseResultAdmin(admin.ModelAdmin):
+    list_display = 'name', 'status', 'duration', 'solution'
+    list_filter = 'status', 'task'
+    search_fields = 'name',
+    list_select_related = 'solution__task', 'solution__author'
+    readonly_fields = 'solution', 'task', 'name', 'status', 'duration', 'output'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_student:
+            qs = qs.filter(solution__author=request.user)
+        return qs
+
+
+admin_site.register(TestCaseResult, TestCaseResultAdmin)
+
+
+class RegradeAdmin(admin.ModelAdmin):
+    list_display = '__str__', 'total', 'done', 'failed', 'remaining', 'throughput_display', 'created_at', 'finished_at'
+    readonly_fields = (
+        'tasks', 'started_by', 'concurrency', 'low_priority', 'total', 'done', 'failed', 'remaining', 'throughput_display',
+        'created_at', 'finished_at',
+    )
+
+    @admin.display(description='Осталось')
+    def remaining(self, obj: Regrade):
+        return obj.remaining
+
+    @admin.display(description='Решений в минуту')
+    def throughput_display(self, obj: Regrade):
+        return f'{obj.throughput:.1f}'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin_site.register(Regrade, RegradeAdmin)
+
 
 class EnvironmentAdmin(admin.ModelAdmin):
-    list_display = 'name', 'docker_image'
+    list_display = 'name', 'sandbox_backend', 'docker_image'
+    list_filter = 'sandbox_backend',
     search_fields = 'name', 'docker_image'
 
 
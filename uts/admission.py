@@ -0,0 +1,157 @@
+"""Admission of sandbox runs by the CPU and memory of the worker host.
+
+Every sandbox run reserves one core and the memory limit of its task on the
+host it runs on, for as long as the run lasts. A run that does not fit into the
+capacity left waits for the runs in flight to finish instead of failing, so
+light runs fill the host while a batch of heavy ones cannot overcommit it.
+Reservations live in Redis, because the Celery prefork children (and several
+workers of one host) share no memory. A run may overtake older waiters that do
+not fit yet, but only until the oldest one has waited ``ADMISSION_BYPASS``
+seconds; after that runs are admitted strictly in order.
+"""
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+
+from uts.utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'uts:admission:'
+HOSTS_KEY = KEY_PREFIX + 'hosts'
+POLL_INTERVAL = 0.5
+# A waiter that has not polled for this many seconds is gone
+WAITER_TIMEOUT = 30
+CPUS_PER_RUN = 1
+
+
+def _key(host, name):
+    return KEY_PREFIX + f'{host}:{name}'
+
+
+def host():
+    return settings.ADMISSION_HOST or socket.gethostname()
+
+
+def capacity():
+    """(cores, MB of memory) the sandbox runs of this host may reserve."""
+    cpus = settings.ADMISSION_CPUS or os.cpu_count() or 1
+    memory = settings.ADMISSION_MEMORY
+    if not memory:
+        # 80% of the physical memory leaves room for the worker and the system
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024) * 4 // 5
+    return cpus, memory
+
+
+def _reap(client, host, now):
+    reservations = _key(host, 'reservations')
+    for reservation_id, value in client.hgetall(reservations).items():
+        if json.loads(value)['started_at'] < now - settings.SCHEDULER_JOB_TIMEOUT:
+            logger.warning('Reservation %s of %s was lost, releasing it', reservation_id, host)
+            client.hdel(reservations, reservation_id)
+    for waiter_id, seen_at in client.hgetall(_key(host, 'seen')).items():
+        if float(seen_at) < now - WAITER_TIMEOUT:
+            client.zrem(_key(host, 'waiting'), waiter_id)
+            client.hdel(_key(host, 'seen'), waiter_id)
+
+
+def _reserved(client, host):
+    reservations = [json.loads(value) for value in client.hvals(_key(host, 'reservations'))]
+    return (
+        sum(reservation['cpus'] for reservation in reservations),
+        sum(reservation['memory'] for reservation in reservations),
+        len(reservations),
+    )
+
+
+def _try_admit(client, host, reservation, waiting_since):
+    now = time.time()
+    with client.lock(_key(host, 'lock'), timeout=30, blocking_timeout=30):
+        _reap(client, host, now)
+        cpus, memory = capacity()
+        reserved_cpus, reserved_memory, running = _reserved(client, host)
+        # A run larger than the whole host is admitted alone
+        fits = not running or (
+            reserved_cpus + reservation['cpus'] <= cpus and reserved_memory + reservation['memory'] <= memory
+        )
+        if not fits:
+            return False
+        oldest = client.zrange(_key(host, 'waiting'), 0, 0, withscores=True)
+        if oldest and oldest[0][0] != reservation['id'] and oldest[0][1] < now - settings.ADMISSION_BYPASS:
+            return False
+        reservation['started_at'] = now
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(_key(host, 'reservations'), reservation['id'], json.dumps(reservation))
+        pipe.zrem(_key(host, 'waiting'), reservation['id'])
+        pipe.hdel(_key(host, 'seen'), reservation['id'])
+        pipe.hincrby(_key(host, 'stats'), 'admitted', 1)
+        pipe.hincrbyfloat(_key(host, 'stats'), 'wait_seconds', now - waiting_since)
+        pipe.hset(HOSTS_KEY, host, json.dumps({'cpus': cpus, 'memory': memory}))
+        pipe.execute()
+        return True
+
+
+@contextmanager
+def reserve(limits):
+    """Holds a reservation for a sandbox run with ``limits``, waiting until it fits.
+
+    Yields the seconds spent waiting. Without Redis the run is not held back.
+    """
+    if not settings.ADMISSION_ENABLED:
+        yield 0.0
+        return
+    client = get_redis(decode_responses=True)
+    name = host()
+    reservation = {'id': str(uuid.uuid4()), 'cpus': CPUS_PER_RUN, 'memory': limits['memory']}
+    started_at = time.time()
+    try:
+        admitted = _try_admit(client, name, reservation, started_at)
+        if not admitted:
+            client.zadd(_key(name, 'waiting'), {reservation['id']: started_at})
+        while not admitted:
+            client.hset(_key(name, 'seen'), reservation['id'], time.time())
+            time.sleep(POLL_INTERVAL)
+            admitted = _try_admit(client, name, reservation, started_at)
+    except redis.RedisError:
+        logger.warning('Failed to reserve resources for a sandbox run, running it anyway', exc_info=True)
+        admitted = False
+    if not admitted:
+        yield time.time() - started_at
+        return
+    try:
+        yield reservation['started_at'] - started_at
+    finally:
+        try:
+            client.hdel(_key(name, 'reservations'), reservation['id'])
+        except redis.RedisError:
+            logger.warning('Failed to release reservation %s', reservation['id'], exc_info=True)
+
+
+def stats():
+    client = get_redis(decode_responses=True)
+    result = []
+    for name, value in sorted(client.hgetall(HOSTS_KEY).items()):
+        host_capacity = json.loads(value)
+        reserved_cpus, reserved_memory, running = _reserved(client, name)
+        counters = client.hgetall(_key(name, 'stats'))
+        admitted = int(counters.get('admitted', 0))
+        wait = float(counters.get('wait_seconds', 0))
+        result.append({
+            'host': name,
+            'cpus': host_capacity['cpus'],
+            'memory': host_capacity['memory'],
+            'reserved_cpus': reserved_cpus,
+            'reserved_memory': reserved_memory,
+            'running': running,
+            'waiting': client.zcard(_key(name, 'waiting')),
+            'admitted': admitted,
+            'average_wait': wait / admitted if admitted else 0.0,
+        })
+    return result
@@ -0,0 +1,255 @@
+"""End-to-end benchmark of the submission pipeline.
+
+Uploads go through the real upload view, the ``post_save`` signal, the
+scheduler, Celery and ``run_solution``; only the sandbox is replaced by a fake
+backend that sleeps for a configurable time. Every solution gets timestamps at
+the stage boundaries:
+
+    created    the solution row is saved by the upload view
+    published  its Celery task is sent (eager Celery has no broker, so it is
+               the same as started)
+    started    the task starts in a worker
+    sandbox    the fake sandbox starts and ends
+    finished   the task returns, results are saved
+"""
+import contextlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import epicbox
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import Client
+from django.urls import resolve, reverse
+
+from uts import pool, profiles
+from uts.models import Environment, Solution, Task, User
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'benchmark-'
+PERCENTILES = 50, 95, 99
+STAGES = (
+    ('upload', 'upload_started', 'upload_finished'),
+    ('enqueue', 'created', 'published'),
+    ('queue wait', 'published', 'started'),
+    ('sandbox', 'sandbox_started', 'sandbox_finished'),
+    ('db save', 'sandbox_finished', 'finished'),
+    ('total', 'upload_started', 'finished'),
+)
+TASKS = 'uts.tasks.run_solution', 'uts.tasks.run_scheduled_job'
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return None
+    rank = max(0, -(-len(values) * percent // 100) - 1)
+    return values[rank]
+
+
+class Recorder:
+    """Collects stage timestamps of every solution, from any thread."""
+
+    def __init__(self):
+        self.marks = {}
+        self.current = threading.local()
+        self.lock = threading.Lock()
+
+    def mark(self, solution_id, name, overwrite=True, at=None):
+        at = time.time() if at is None else at
+        with self.lock:
+            marks = self.marks.setdefault(solution_id, {})
+            if overwrite or name not in marks:
+                marks[name] = at
+
+    def finished(self):
+        with self.lock:
+            return sum('finished' in marks for marks in self.marks.values())
+
+    def durations(self):
+        result = {}
+        for stage, start, end in STAGES:
+            result[stage] = [
+                marks[end] - marks[start]
+                for marks in self.marks.values()
+                if start in marks and end in marks
+            ]
+        return result
+
+    @staticmethod
+    def _solution_id(task_name, args):
+        if task_name == TASKS[0]:
+            return args[0]
+        return args[0]['solution']
+
+    def on_created(self, sender, instance, created, **__):
+        # Eager Celery may run the whole check before this receiver, so the time is taken from the row
+        if created:
+            self.mark(instance.pk, 'created', at=instance.created_at.timestamp())
+
+    def on_publish(self, sender, body, **__):
+        if sender in TASKS:
+            self.mark(self._solution_id(sender, body[0]), 'published')
+
+    def on_prerun(self, sender, args, **__):
+        if sender.name in TASKS:
+            solution_id = self._solution_id(sender.name, args)
+            self.current.solution_id = solution_id
+            self.mark(solution_id, 'published', overwrite=False)
+            self.mark(solution_id, 'started')
+
+    def on_postrun(self, sender, args, **__):
+        if sender.name in TASKS:
+            self.mark(self._solution_id(sender.name, args), 'finished')
+
+    @contextlib.contextmanager
+    def connected(self):
+        post_save.connect(self.on_created, sender=Solution, weak=False)
+        before_task_publish.connect(self.on_publish, weak=False)
+        task_prerun.connect(self.on_prerun, weak=False)
+        task_postrun.connect(self.on_postrun, weak=False)
+        try:
+            yield self
+        finally:
+            post_save.disconnect(self.on_created, sender=Solution)
+            before_task_publish.disconnect(self.on_publish)
+            task_prerun.disconnect(self.on_prerun)
+            task_postrun.disconnect(self.on_postrun)
+
+
+class FakeSandbox:
+    """Stands in for both ``pool.run`` and ``epicbox.run``."""
+
+    def __init__(self, recorder, run_time, jitter=0.0, fail_rate=0.0):
+        self.recorder = recorder
+        self.run_time = run_time
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+
+    def __call__(self, *args, on_output=None, **kwargs):
+        solution_id = getattr(self.recorder.current, 'solution_id', None)
+        self.recorder.mark(solution_id, 'sandbox_started')
+        duration = max(0.0, random.uniform(self.run_time - self.jitter, self.run_time + self.jitter))
+        time.sleep(duration)
+        failed = random.random() < self.fail_rate
+        stdout = b'##uts-summary## {"cases": [{"name": "test", "status": "%s", "duration": 0}]}\n' % (
+            b'failed' if failed else b'passed'
+        )
+        if on_output is not None:
+            on_output('stdout', stdout)
+        self.recorder.mark(solution_id, 'sandbox_finished')
+        return {
+            'exit_code': int(failed),
+            'stdout': stdout,
+            'stderr': b'',
+            'output_size': len(stdout),
+            'duration': duration,
+            'timeout': False,
+            'oom_killed': False,
+        }
+
+    @contextlib.contextmanager
+    def installed(self):
+        saved = pool.run, epicbox.run, epicbox.working_directory, profiles.resolve_image
+        pool.run = epicbox.run = self
+        epicbox.working_directory = contextlib.nullcontext
+        profiles.resolve_image = lambda image, pull=False: f'benchmark:{image}'
+        profiles.invalidate()
+        try:
+            yield self
+        finally:
+            pool.run, epicbox.run, epicbox.working_directory, profiles.resolve_image = saved
+            profiles.invalidate()
+
+
+def create_fixtures(solutions, tasks):
+    environment = Environment.objects.order_by('pk').first()
+    task_objects = [
+        Task.objects.create(
+            name=f'{PREFIX}{i}',
+            description='Задача для нагрузочного теста',
+            environment=environment,
+            tests_file=SimpleUploadedFile('tests', b'# benchmark'),
+        )
+        for i in range(tasks)
+    ]
+    users = [
+        User.objects.create_user(f'{PREFIX}{i}', is_student=True, is_staff=True)
+        for i in range(-(-solutions // tasks))
+    ]
+    return task_objects, users
+
+
+def delete_fixtures():
+    for solution in Solution.objects.filter(task__name__startswith=PREFIX):
+        solution.solution_file.delete(save=False)
+        if solution.log_file:
+            solution.log_file.delete(save=False)
+    for task in Task.objects.filter(name__startswith=PREFIX):
+        task.tests_file.delete(save=False)
+    Task.objects.filter(name__startswith=PREFIX).delete()
+    User.objects.filter(username__startswith=PREFIX).delete()
+
+
+def upload(recorder, user, task, number):
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    started = time.time()
+    try:
+        response = client.post(
+            reverse('admin:upload-solution', args=(task.pk,)),
+            {'file': SimpleUploadedFile('solution', b'# benchmark solution %d\n' % number)},
+        )
+        finished = time.time()
+        if response.status_code != 302:
+            logger.warning('Benchmark upload %s failed with status %s', number, response.status_code)
+            return False
+        solution_id = int(resolve(response.url).kwargs['object_id'])
+        with recorder.lock:
+            recorder.marks.setdefault(solution_id, {}).update(upload_started=started, upload_finished=finished)
+        return True
+    finally:
+        connection.close()
+
+
+def run(solutions, tasks, concurrency, run_time, jitter=0.0, fail_rate=0.0, timeout=600):
+    """Upload ``solutions`` solutions and wait until all of them are checked.
+
+    Returns a dict with the number of uploads, failed uploads, checked
+    solutions, the wall time and the durations of every stage.
+    """
+    if 'testserver' not in settings.ALLOWED_HOSTS:
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+    delete_fixtures()
+    task_objects, users = create_fixtures(solutions, tasks)
+    recorder = Recorder()
+    try:
+        with recorder.connected(), FakeSandbox(recorder, run_time, jitter, fail_rate).installed():
+            started = time.time()
+            with ThreadPoolExecutor(concurrency) as executor:
+                uploads = [
+                    executor.submit(upload, recorder, users[i // tasks], task_objects[i % tasks], i)
+                    for i in range(solutions)
+                ]
+                uploaded = sum(future.result() for future in uploads)
+            deadline = time.time() + timeout
+            while recorder.finished() < uploaded and time.time() < deadline:
+                time.sleep(0.1)
+            wall_time = time.time() - started
+    finally:
+        delete_fixtures()
+
+    return {
+        'uploaded': uploaded,
+        'upload_errors': solutions - uploaded,
+        'checked': recorder.finished(),
+        'wall_time': wall_time,
+        'durations': recorder.durations(),
+    }
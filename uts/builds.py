@@ -0,0 +1,96 @@
+"""Compile-once build phase of environments with a build command.
+
+The build runs in the same sandbox as the tests, with only the solution file.
+The backends return nothing but the output of a command, so the build output
+goes to stderr and the artifact itself is written to stdout. Builds are cached
+by the content of the solution, the sandbox identity (the image) and the build
+settings of the environment: a regrade or an identical resubmission reuses the
+artifact and only runs the tests. Failed builds are cached too, a compiler
+gives the same errors for the same source.
+"""
+import hashlib
+import shlex
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from uts import admission, output, storage
+from uts.models import BuildArtifact
+
+ARTIFACT_MODE = 0o755
+
+
+def make_key(environment, sandbox_id, solution_digest):
+    parts = (
+        solution_digest,
+        sandbox_id,
+        environment.build_command,
+        environment.solution_filename,
+        environment.build_artifact,
+    )
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def _build(sandbox, environment, source, key, cancelled=None):
+    command = f'({environment.build_command}) >&2 && cat {shlex.quote(environment.build_artifact)}'
+    limits = {
+        'cputime': settings.BUILD_CPU_LIMIT,
+        'realtime': settings.BUILD_CPU_LIMIT * 5,
+        'memory': settings.BUILD_MEMORY_LIMIT,
+        'processes': 15,
+    }
+    with admission.reserve(limits):
+        report = sandbox.run(environment, files=[source], limits=limits, command=command, cancelled=cancelled)
+    log, _ = output.head_tail(report['stderr'].decode('utf8', errors='replace'))
+    # A truncated artifact would fail in a confusing way, it is reported as a build error instead
+    too_large = len(report['stdout']) >= settings.SANDBOX_OUTPUT_CAPTURE_LIMIT
+    if report['timeout']:
+        log += '\nСборка прервана по таймауту'
+    elif report['oom_killed']:
+        log += '\nСборка прервана по превышению лимита ОЗУ'
+    elif too_large:
+        log += '\nРезультат сборки слишком большой'
+    success = not (report['exit_code'] or report['timeout'] or report['oom_killed'] or too_large)
+    artifact = BuildArtifact(
+        key=key,
+        environment=environment,
+        success=success,
+        log=log,
+        duration=report['duration'],
+        used_at=timezone.now(),
+    )
+    if success:
+        artifact.artifact_file.save(environment.build_artifact, ContentFile(report['stdout']), save=False)
+    # Timeouts depend on the load of the host at the moment, so they are not cached, nor are killed builds
+    if report['timeout'] or not settings.BUILD_CACHE_SIZE or cancelled is not None and cancelled(force=True):
+        return artifact
+    try:
+        with transaction.atomic():
+            artifact.save()
+    except IntegrityError:
+        # The same solution was built by another worker at the same time
+        return artifact
+    evicted = BuildArtifact.objects.order_by('-used_at').values_list('pk', flat=True)[settings.BUILD_CACHE_SIZE:]
+    BuildArtifact.objects.filter(pk__in=list(evicted)).delete()
+    return artifact
+
+
+def get_or_build(sandbox, environment, solution, cancelled=None):
+    """Returns (BuildArtifact, whether it was taken from the cache).
+
+    A build stopped by ``cancelled`` is returned, but not cached.
+    """
+    key = make_key(environment, sandbox.identity(environment), storage.file_digest(solution.solution_file))
+    artifact = BuildArtifact.objects.filter(key=key).first()
+    if artifact is not None:
+        BuildArtifact.objects.filter(pk=artifact.pk).update(used_at=timezone.now(), hits=F('hits') + 1)
+        return artifact, True
+    source = {'name': environment.solution_filename, 'file': solution.solution_file}
+    return _build(sandbox, environment, source, key, cancelled), False
+
+
+def artifact_input(environment, artifact):
+    return {'name': environment.build_artifact, 'file': artifact.artifact_file, 'mode': ARTIFACT_MODE}
@@ -0,0 +1,90 @@
+"""Admin changelist pieces for tables with millions of rows.
+
+``EstimatedCountPaginator`` never counts more than ``ADMIN_COUNT_LIMIT`` rows,
+and an unfiltered PostgreSQL table is counted from the planner statistics.
+``KeysetChangeList`` pages by the last row of the previous page instead of an
+OFFSET while the list has its default ordering, so every page costs the same
+index range scan. Sorting by a column falls back to numbered pages.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'after'
+
+
+class EstimatedCountPaginator(Paginator):
+    # The count comes from the table statistics, or there are more rows than it says
+    estimated = False
+    truncated = False
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > limit:
+                self.estimated = True
+                return row[0]
+        count = queryset.values('pk')[:limit + 1].count()
+        self.truncated = count > limit
+        return min(count, limit)
+
+
+class KeysetChangeList(ChangeList):
+    """Keyset pagination over the default ``(-created_at, -pk)`` ordering."""
+
+    keyset = False
+    cursor = None
+    next_page_url = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # A filter or a new ordering starts from the first page
+        return super().get_query_string(new_params, [*(remove or ()), CURSOR_VAR])
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params or self.show_all:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        self.cursor = self.params.get(CURSOR_VAR)
+        if self.cursor:
+            try:
+                created_at, pk = self.cursor.rsplit('_', 1)
+                created_at, pk = datetime.fromisoformat(created_at), int(pk)
+            except ValueError:
+                raise IncorrectLookupParameters
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        rows = list(queryset.order_by('-created_at', '-pk')[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            last = rows[self.list_per_page - 1]
+            self.next_page_url = self.get_query_string({CURSOR_VAR: f'{last.created_at.isoformat()}_{last.pk}'})
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.keyset = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_page_url)
+        self.paginator = paginator
@@ -0,0 +1,119 @@
+"""Results of solutions as CSV, streamed row by row.
+
+Rows are read with ``values().iterator()``, a server-side cursor on
+PostgreSQL, and written as soon as they arrive, so memory does not grow with
+the number of solutions. The pivot layout (students as rows, tasks as columns)
+is a single grouped query with a conditional aggregate per task.
+"""
+import csv
+
+from django.db.models import Case, Count, IntegerField, Max, Q, Sum, Value, When
+from django.utils import timezone
+
+from uts.models import Solution, Task, TestCaseResult, User
+
+CHUNK_SIZE = 2000
+# Without the byte order mark Excel reads the file in a legacy encoding
+BOM = '\ufeff'
+
+SOLUTION_HEADER = (
+    'Логин', 'Фамилия', 'Имя', 'Задача', 'Состояние', 'Зачтено', 'Загружено',
+    'Длительность тестов (с)', 'Тестов пройдено', 'Тестов не пройдено',
+)
+
+FAILED_STATUSES = (
+    TestCaseResult.FAILED, TestCaseResult.ERROR, TestCaseResult.TIMEOUT, TestCaseResult.OUTPUT_LIMIT,
+)
+
+NOT_SOLVED, SOLVED, CHECKED = 0, 1, 2
+PIVOT_LABELS = {None: '', NOT_SOLVED: 'не решена', SOLVED: 'решена', CHECKED: 'зачтена'}
+
+
+class _Echo:
+    """File-like object whose write returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield BOM + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _format_time(value):
+    if value is None:
+        return ''
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def solution_rows(tasks=None):
+    solutions = Solution.objects.all()
+    if tasks is not None:
+        solutions = solutions.filter(task__in=tasks)
+    rows = (
+        solutions
+        .values(
+            'pk', 'author__username', 'author__last_name', 'author__first_name', 'task__name',
+            'state', 'checked', 'created_at',
+        )
+        .annotate(
+            duration=Sum('test_results__duration'),
+            passed=Count('test_results', filter=Q(test_results__status=TestCaseResult.PASSED)),
+            failed=Count('test_results', filter=Q(test_results__status__in=FAILED_STATUSES)),
+        )
+        .order_by('task__name', 'author__username')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    states = dict(Solution.STATE_CHOICES)
+    for row in rows:
+        yield (
+            row['author__username'],
+            row['author__last_name'],
+            row['author__first_name'],
+            row['task__name'],
+            states.get(row['state'], row['state']),
+            'да' if row['checked'] else 'нет',
+            _format_time(row['created_at']),
+            '' if row['duration'] is None else f'{row["duration"]:.3f}',
+            row['passed'],
+            row['failed'],
+        )
+
+
+def pivot_rows(tasks):
+    """Students as rows and ``tasks`` as columns, the cell is the status of the task."""
+    columns = {
+        f'task_{task.pk}': Max(Case(
+            When(taskstatus__task_id=task.pk, taskstatus__checked=True, then=Value(CHECKED)),
+            When(taskstatus__task_id=task.pk, taskstatus__solved=True, then=Value(SOLVED)),
+            When(taskstatus__task_id=task.pk, then=Value(NOT_SOLVED)),
+            output_field=IntegerField(),
+        ))
+        for task in tasks
+    }
+    rows = (
+        User.objects
+        .filter(is_student=True)
+        .values('username', 'last_name', 'first_name')
+        .annotate(**columns)
+        .order_by('username')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for row in rows:
+        yield (
+            row['username'], row['last_name'], row['first_name'],
+            *(PIVOT_LABELS[row[column]] for column in columns),
+        )
+
+
+def export(tasks=None, pivot=False):
+    """Yields the lines of the CSV file."""
+    if pivot:
+        tasks = list(Task.objects.order_by('name') if tasks is None else tasks)
+        return _csv(('Логин', 'Фамилия', 'Имя', *(task.name for task in tasks)), pivot_rows(tasks))
+    return _csv(SOLUTION_HEADER, solution_rows(tasks))
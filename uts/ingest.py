@@ -0,0 +1,156 @@
+"""Bulk loading of solutions from a zip or tar archive.
+
+Every file of the archive is a solution of the student whose username is the
+first directory of its path (``ivanov/main.py``) or, for files in the root of
+the archive, the file name without extension (``ivanov.py``). Members are
+streamed one by one into the storage, rows are inserted with ``bulk_create``
+and the runs are enqueued per batch, so memory use does not depend on the size
+of the archive.
+"""
+import os
+import tarfile
+import time
+import zipfile
+from collections import namedtuple
+
+from celery import group
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from uts import scheduler, statuses, storage
+from uts.models import Solution, User
+from uts.tasks import run_solution
+
+IngestReport = namedtuple('IngestReport', 'created skipped')
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _members(fileobj, name):
+    """Yields (path, size, stream) of every regular file of the archive."""
+    if name.lower().endswith('.zip'):
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f'Не удалось прочитать zip-архив: {e}')
+        with archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as stream:
+                        yield info.filename, info.file_size, stream
+        return
+
+    try:
+        # Stream mode reads the archive sequentially and never seeks back
+        archive = tarfile.open(fileobj=fileobj, mode='r|*')
+    except tarfile.TarError as e:
+        raise ArchiveError(f'Не удалось прочитать tar-архив: {e}')
+    with archive:
+        for info in archive:
+            if info.isfile():
+                yield info.name, info.size, archive.extractfile(info)
+
+
+def _username(path):
+    parts = [part for part in path.replace('\\', '/').split('/') if part and part != '.']
+    if not parts or any(part.startswith(('.', '__MACOSX')) for part in parts):
+        return None
+    if len(parts) == 1:
+        return os.path.splitext(parts[0])[0]
+    return parts[0]
+
+
+def _enqueue(task, rows):
+    if settings.SCHEDULER_ENABLED:
+        scheduler.enqueue([
+            scheduler.make_job(pk, task, f'user:{author_id}', settings.SCHEDULER_STUDENT_IN_FLIGHT)
+            for pk, author_id in rows
+        ])
+    else:
+        enqueued_at = time.time()
+        group(run_solution.si(pk, enqueued_at) for pk, _ in rows).delay()
+
+
+def _insert(task, batch):
+    authors = [solution.author_id for solution in batch]
+    try:
+        with transaction.atomic():
+            Solution.objects.filter(task=task, author_id__in=authors).delete()
+            Solution.objects.bulk_create(batch)
+            # bulk_create sends no post_save, which counts blob references for single saves
+            storage.add_references([solution.solution_file.name for solution in batch])
+            # Not every database returns primary keys from bulk_create
+            rows = list(
+                Solution.objects
+                .filter(task=task, author_id__in=authors, state=Solution.NEW)
+                .values_list('pk', 'author_id')
+            )
+            transaction.on_commit(lambda: _enqueue(task, rows))
+    except Exception:
+        for solution in batch:
+            solution.solution_file.delete(save=False)
+        raise
+
+
+def ingest_archive(task, fileobj, name, batch_size=None):
+    """Creates a solution of ``task`` for every student file of the archive.
+
+    A student's previous solutions of the task are replaced, like on a manual
+    upload. Files of unknown users, non-students and duplicates are skipped
+    and listed in the report with the reason.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    created = 0
+    skipped = []
+    seen = set()
+    pending = []
+
+    def flush():
+        nonlocal created
+        usernames = [username for username, _, _ in pending]
+        users = {user.username: user for user in User.objects.filter(username__in=usernames).only('username', 'is_student')}
+        batch = []
+        for username, path, solution in pending:
+            user = users.get(username)
+            if user is None or not user.is_student:
+                skipped.append((path, 'пользователь не найден' if user is None else 'пользователь не является студентом'))
+                solution.solution_file.delete(save=False)
+                continue
+            solution.author = user
+            batch.append(solution)
+        if batch:
+            _insert(task, batch)
+            created += len(batch)
+        pending.clear()
+
+    try:
+        for path, size, stream in _members(fileobj, name):
+            username = _username(path)
+            if username is None:
+                continue
+            if username in seen:
+                skipped.append((path, 'у пользователя несколько файлов'))
+                continue
+            seen.add(username)
+            if size > settings.INGEST_MAX_FILE_SIZE:
+                skipped.append((path, 'файл слишком большой'))
+                continue
+            # The member goes straight to the storage: a streamed tar cannot come back to it later
+            solution = Solution(task=task, created_at=timezone.now())
+            solution.solution_file.save(os.path.basename(path), File(stream), save=False)
+            pending.append((username, path, solution))
+            if len(pending) >= batch_size:
+                flush()
+        if pending:
+            flush()
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        for _, _, solution in pending:
+            solution.solution_file.delete(save=False)
+        raise ArchiveError(f'Архив повреждён: {e}')
+
+    statuses.rebuild(tasks=[task])
+    return IngestReport(created, skipped)
@@ -0,0 +1,96 @@
+"""Input files of a sandbox run.
+
+A file is either ``{'name': ..., 'content': bytes}`` or ``{'name': ...,
+'file': FieldFile}``, with an optional ``'mode'`` for executables. Backends
+stream the stored files into the sandbox in chunks, so a large solution is
+never held in memory as a whole; only epicbox, which takes bytes, reads it at
+once and ignores the mode.
+
+Tests of a task are the same for every one of its solutions, so a worker keeps
+the recently used ones in a bounded in-memory LRU cache, keyed by the blob
+digest (the name of a blob is the hash of its content) or, for files stored
+before blobs, by the name and the modification time.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from uts import storage
+
+DEFAULT_MODE = 0o644
+
+_cache = OrderedDict()
+_cache_size = 0
+_cache_lock = threading.Lock()
+
+
+def mode(file):
+    return file.get('mode', DEFAULT_MODE)
+
+
+def size(file):
+    if 'content' in file:
+        return len(file['content'])
+    return file['file'].size
+
+
+def stream(file):
+    """Binary stream of the file, to be used as a context manager."""
+    if 'content' in file:
+        return io.BytesIO(file['content'])
+    return file['file'].open('rb')
+
+
+def chunks(file):
+    with stream(file) as f:
+        while True:
+            chunk = f.read(storage.CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def read(file):
+    if 'content' in file:
+        return file['content']
+    return b''.join(chunks(file))
+
+
+def _cache_key(field_file):
+    return storage.digest(field_file.name) or (
+        field_file.name, field_file.storage.get_modified_time(field_file.name).timestamp(),
+    )
+
+
+def read_cached(field_file):
+    """Content of a stored file, from the worker cache when possible."""
+    global _cache_size
+    limit = settings.TEST_FILE_CACHE_SIZE
+    key = _cache_key(field_file)
+    with _cache_lock:
+        content = _cache.get(key)
+        if content is not None:
+            _cache.move_to_end(key)
+            return content
+
+    content = read({'file': field_file})
+    # A single file may take at most a quarter of the cache, so one huge test does not flush all others
+    if len(content) > limit // 4:
+        return content
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = content
+            _cache_size += len(content)
+        while _cache_size > limit:
+            _, evicted = _cache.popitem(last=False)
+            _cache_size -= len(evicted)
+    return content
+
+
+def clear_cache():
+    global _cache_size
+    with _cache_lock:
+        _cache.clear()
+        _cache_size = 0
@@ -0,0 +1,246 @@
+"""Live progress of a solution over Server-Sent Events.
+
+``run_solution`` publishes state changes and sandbox output to a Redis channel
+of the solution. Output is also appended to a short-lived list, so a page opened
+in the middle of a run first gets what was printed so far. The ASGI app below
+relays both to the browser without touching the sync workers: a single thread
+per process holds one pattern subscription to all solution channels and hands
+the messages to the asyncio queues of the connections watching them.
+"""
+import asyncio
+import codecs
+import json
+import logging
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from uts.utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'uts:live:solution:'
+PATH_RE = re.compile(r'^' + re.escape(settings.LIVE_URL_PREFIX) + r'(\d+)/$')
+
+
+def url(solution_id):
+    return f'{settings.LIVE_URL_PREFIX}{solution_id}/'
+
+
+def _channel(solution_id):
+    return f'{KEY_PREFIX}{solution_id}'
+
+
+def _backlog(solution_id):
+    return f'{KEY_PREFIX}{solution_id}:output'
+
+
+def _publish(solution_id, message):
+    try:
+        get_redis(decode_responses=True).publish(_channel(solution_id), json.dumps(message))
+    except redis.RedisError:
+        logger.warning('Failed to publish live progress of solution %s', solution_id, exc_info=True)
+
+
+def publish_state(solution):
+    from uts.models import Solution
+    if solution.state == Solution.RUNNING:
+        try:
+            get_redis(decode_responses=True).delete(_backlog(solution.pk))
+        except redis.RedisError:
+            logger.warning('Failed to reset live output of solution %s', solution.pk, exc_info=True)
+    _publish(solution.pk, {'event': 'state', 'state': solution.state})
+
+
+class OutputPublisher:
+    """Callback for ``pool.run`` that forwards sandbox output as it arrives."""
+
+    def __init__(self, solution_id):
+        self.solution_id = solution_id
+        self.sent = 0
+        self.decoders = {stream: codecs.getincrementaldecoder('utf8')(errors='replace') for stream in ('stdout', 'stderr')}
+
+    def __call__(self, stream, chunk):
+        limit = settings.LIVE_OUTPUT_LIMIT
+        if self.sent >= limit:
+            return
+        text = self.decoders[stream].decode(chunk)[:limit - self.sent]
+        if not text:
+            return
+        self.sent += len(text)
+        message = {'event': 'output', 'stream': stream, 'text': text}
+        try:
+            client = get_redis(decode_responses=True)
+            message['seq'] = client.rpush(_backlog(self.solution_id), json.dumps(message))
+            client.expire(_backlog(self.solution_id), settings.SCHEDULER_JOB_TIMEOUT)
+        except redis.RedisError:
+            logger.warning('Failed to store live output of solution %s', self.solution_id, exc_info=True)
+        _publish(self.solution_id, message)
+
+
+class _Hub:
+    """The Redis subscription of the process, fanned out to asyncio queues of the connections."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listeners = {}
+        self.thread = None
+        self.ready = threading.Event()
+
+    def listen(self, solution_id):
+        queue = asyncio.Queue()
+        with self.lock:
+            self.listeners.setdefault(solution_id, set()).add((asyncio.get_running_loop(), queue))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='live-hub', daemon=True)
+                self.thread.start()
+        return queue
+
+    def forget(self, solution_id, queue):
+        with self.lock:
+            listeners = self.listeners.get(solution_id, set())
+            listeners.discard((asyncio.get_running_loop(), queue))
+            if not listeners:
+                self.listeners.pop(solution_id, None)
+
+    def _dispatch(self, raw):
+        solution_id = int(raw['channel'][len(KEY_PREFIX):])
+        with self.lock:
+            listeners = list(self.listeners.get(solution_id, ()))
+        for loop, queue in listeners:
+            loop.call_soon_threadsafe(queue.put_nowait, raw['data'])
+
+    def _run(self):
+        while True:
+            pubsub = get_redis(decode_responses=True).pubsub()
+            try:
+                pubsub.psubscribe(KEY_PREFIX + '*')
+                while True:
+                    raw = pubsub.get_message(timeout=1)
+                    if raw is None:
+                        continue
+                    if raw['type'] == 'psubscribe':
+                        self.ready.set()
+                    elif raw['type'] == 'pmessage' and raw['channel'].startswith(KEY_PREFIX):
+                        self._dispatch(raw)
+            except redis.RedisError:
+                logger.warning('Live progress subscription failed, reconnecting', exc_info=True)
+                self.ready.clear()
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+
+_hub = _Hub()
+
+
+def _load_state(session_key, solution_id):
+    from django.contrib.auth import get_user
+    from django.http import HttpRequest
+
+    from uts.models import Solution
+
+    close_old_connections()
+    try:
+        request = HttpRequest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        user = get_user(request)
+        if not (user.is_active and user.is_staff):
+            return None
+        solutions = Solution.objects.filter(pk=solution_id)
+        if user.is_student:
+            solutions = solutions.filter(author=user)
+        return solutions.values_list('state', flat=True).first()
+    finally:
+        close_old_connections()
+
+
+def _event(message):
+    return f'event: {message["event"]}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n'.encode('utf8')
+
+
+async def _respond(send, status, body=b''):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def application(scope, receive, send):
+    from uts.models import Solution
+
+    solution_id = int(PATH_RE.match(scope['path']).group(1))
+    cookies = SimpleCookie()
+    for name, value in scope['headers']:
+        if name == b'cookie':
+            cookies.load(value.decode('latin1'))
+    session = cookies.get(settings.SESSION_COOKIE_NAME)
+    state = await sync_to_async(_load_state)(session.value if session else None, solution_id)
+    if state is None:
+        await _respond(send, 404)
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': _event({'event': 'state', 'state': state}), 'more_body': True})
+    if state not in (Solution.NEW, Solution.RUNNING):
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    disconnected = asyncio.Event()
+    queue = _hub.listen(solution_id)
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+        queue.put_nowait(None)
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        # Only the first connection of the process waits for the subscription,
+        # nothing published between it and the backlog read below is lost
+        if not _hub.ready.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, _hub.ready.wait, 5)
+        backlog = await sync_to_async(get_redis(decode_responses=True).lrange, thread_sensitive=False)(
+            _backlog(solution_id), 0, -1,
+        )
+        for item in backlog:
+            await send({'type': 'http.response.body', 'body': _event(json.loads(item)), 'more_body': True})
+        seen = len(backlog)
+
+        while not disconnected.is_set():
+            try:
+                data = await asyncio.wait_for(queue.get(), settings.LIVE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+            if data is None:
+                break
+            message = json.loads(data)
+            if message.get('seq', seen + 1) <= seen:
+                continue
+            await send({'type': 'http.response.body', 'body': _event(message), 'more_body': True})
+            if message['event'] == 'state' and message['state'] not in (Solution.NEW, Solution.RUNNING):
+                break
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        _hub.forget(solution_id, queue)
+
+
+def matches(scope):
+    return scope['type'] == 'http' and PATH_RE.match(scope['path']) is not None
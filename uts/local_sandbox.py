@@ -0,0 +1,258 @@
+"""Runs a command as a plain process on the worker.
+
+There is no container to start, so a run costs a fork and a temporary
+directory. The process gets rlimits for CPU time, memory, processes and written
+files, a minimal environment and, unless ``LOCAL_SANDBOX_ISOLATE_NETWORK`` is
+off, its own network namespace without any interfaces; a worker that cannot
+create one fails the runs rather than give them its network. A worker running
+as root starts every run as a user of its own (``LOCAL_SANDBOX_UID_BASE`` plus
+the worker pid), so the process limit counts only that run and everything it
+left behind is killed afterwards. The isolation is much weaker than the Docker
+one: use it for environments whose solutions are trusted or cheap to check,
+such as stdin/stdout tasks.
+"""
+import ctypes
+import logging
+import os
+import resource
+import select
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+
+from uts import inputs
+from uts.output import Capture
+
+logger = logging.getLogger(__name__)
+
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+SIGKILL_EXIT_CODE = 128 + signal.SIGKILL
+SIGXCPU_EXIT_CODE = 128 + signal.SIGXCPU
+
+# Seconds between checks whether a run was cancelled
+CANCEL_CHECK_INTERVAL = 1
+# Seconds to wait for the processes left by a run to be gone
+REAP_TIMEOUT = 1
+# Seconds between checks whether a process that closed its output has exited
+WAIT_INTERVAL = 0.01
+# What a solution prints when an allocation fails under RLIMIT_AS
+OUT_OF_MEMORY_MARKERS = (b'MemoryError', b'std::bad_alloc', b'Cannot allocate memory', b'out of memory')
+
+# Whether the kernel lets runs unshare the network namespace, probed once per process
+_network_isolation = None
+
+
+class LocalSandboxError(Exception):
+    pass
+
+
+def _run_uid():
+    """Uid of the runs of this worker process, or None when it cannot switch users."""
+    if os.geteuid() != 0:
+        return None
+    return settings.LOCAL_SANDBOX_UID_BASE + os.getpid()
+
+
+def _tasks_of(uid):
+    """Processes and threads of ``uid``, which is what RLIMIT_NPROC counts."""
+    count = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            if os.stat(f'/proc/{pid}').st_uid == uid:
+                count += len(os.listdir(f'/proc/{pid}/task'))
+        except OSError:
+            pass
+    return count
+
+
+def _unshare_network():
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(CLONE_NEWUSER | CLONE_NEWNET) != 0:
+        raise OSError(ctypes.get_errno(), 'unshare of the network namespace failed')
+
+
+def _preexec(limits, uid, isolate_network):
+    cputime = limits['cputime']
+    memory = limits['memory'] * 1024 * 1024
+    file_size = settings.SANDBOX_OUTPUT_CAPTURE_LIMIT
+    if uid is None:
+        # Without a user of its own the run shares the limit with the processes of the worker user
+        processes = _tasks_of(os.getuid()) + limits['processes']
+    else:
+        processes = limits['processes']
+
+    def setup():
+        resource.setrlimit(resource.RLIMIT_CPU, (cputime, cputime + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))
+        if uid is not None:
+            os.setgroups([])
+            os.setgid(uid)
+            os.setuid(uid)
+        if isolate_network:
+            _unshare_network()
+    return setup
+
+
+def _isolate_network(uid):
+    """Whether runs get their own network namespace.
+
+    Kernels and container runtimes (Docker's default seccomp profile among
+    them) often refuse unprivileged user namespaces. That is found out once
+    with a trial process; from then on every run fails unless running with the
+    network of the worker was allowed with ``LOCAL_SANDBOX_ISOLATE_NETWORK=0``.
+    """
+    global _network_isolation
+    if not settings.LOCAL_SANDBOX_ISOLATE_NETWORK:
+        return False
+    if _network_isolation is None:
+        limits = {'cputime': 1, 'memory': 64, 'processes': 1}
+        try:
+            subprocess.run(['/bin/true'], preexec_fn=_preexec(limits, uid, True), check=True)
+            _network_isolation = True
+        except (OSError, subprocess.SubprocessError):
+            logger.error('The kernel does not allow unsharing the network namespace, local sandbox runs will fail')
+            _network_isolation = False
+    if not _network_isolation:
+        raise LocalSandboxError(
+            'The network of the solution cannot be isolated: the worker does not allow unprivileged user '
+            'namespaces. Allow them, or set LOCAL_SANDBOX_ISOLATE_NETWORK=0 to run solutions with the network '
+            'of the worker.'
+        )
+    return True
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _kill_user(uid):
+    """Kills every process of ``uid``, including ones that left the session of the run."""
+    subprocess.run(['/bin/sh', '-c', 'kill -9 -1'], preexec_fn=lambda: os.setuid(uid))
+    # Killed orphans count against the process limit of the next run until init reaps them
+    deadline = time.monotonic() + REAP_TIMEOUT
+    while _tasks_of(uid) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _wait(process, deadline, cancelled):
+    """Waits for a process that closed its output, killing it at the deadline.
+
+    Returns the wait status, the resource usage and whether the run timed out.
+    """
+    while True:
+        # wait4 gives the CPU time of the run, Popen.wait would not
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            return status, usage, False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or cancelled is not None and cancelled():
+            _kill(process)
+            _, status, usage = os.wait4(process.pid, 0)
+            return status, usage, remaining <= 0
+        time.sleep(min(remaining, WAIT_INTERVAL))
+
+
+def _out_of_memory(stderr):
+    return any(marker in stderr[-4096:] for marker in OUT_OF_MEMORY_MARKERS)
+
+
+def run(command, files, limits, on_output=None, cancelled=None):
+    uid = _run_uid()
+    isolate_network = _isolate_network(uid)
+    with tempfile.TemporaryDirectory(prefix='uts-sandbox-') as workdir:
+        for file in files:
+            path = os.path.join(workdir, file['name'])
+            with inputs.stream(file) as source, open(path, 'wb') as f:
+                shutil.copyfileobj(source, f)
+            os.chmod(path, inputs.mode(file))
+            if uid is not None:
+                os.chown(path, uid, uid)
+        if uid is not None:
+            os.chown(workdir, uid, uid)
+
+        started_at = time.monotonic()
+        try:
+            process = subprocess.Popen(
+                ['/bin/sh', '-c', command],
+                cwd=workdir,
+                env={'PATH': '/usr/local/bin:/usr/bin:/bin', 'HOME': workdir, 'LANG': 'C.UTF-8'},
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True,
+                preexec_fn=_preexec(limits, uid, isolate_network),
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            raise LocalSandboxError(f'Failed to start the solution process: {e}')
+
+        output = {process.stdout: Capture(), process.stderr: Capture()}
+        names = {process.stdout: 'stdout', process.stderr: 'stderr'}
+        deadline = started_at + limits['realtime']
+        timed_out = False
+        try:
+            streams = list(output)
+            while streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    _kill(process)
+                    break
+                if cancelled is not None and cancelled():
+                    _kill(process)
+                    break
+                readable, _, _ = select.select(streams, [], [], min(remaining, CANCEL_CHECK_INTERVAL))
+                for stream in readable:
+                    chunk = os.read(stream.fileno(), 64 * 1024)
+                    if not chunk:
+                        streams.remove(stream)
+                        continue
+                    # Past the limit the stream is still drained, only its tail is kept
+                    if output[stream].write(chunk) and on_output is not None:
+                        on_output(names[stream], chunk)
+            status, usage, waited_out = _wait(process, deadline, cancelled)
+            timed_out = timed_out or waited_out
+            process.returncode = os.waitstatus_to_exitcode(status)
+        finally:
+            # Background processes left by the solution die with its session, or with its user
+            _kill(process)
+            if uid is not None:
+                _kill_user(uid)
+            process.stdout.close()
+            process.stderr.close()
+        duration = time.monotonic() - started_at
+
+    returncode = process.returncode
+    exit_code = 128 - returncode if returncode < 0 else returncode
+    stdout = output[process.stdout].getvalue()
+    stderr = output[process.stderr].getvalue()
+    # The hard CPU limit is enforced with SIGKILL, any other SIGKILL comes from the kernel OOM killer
+    out_of_cpu = exit_code == SIGXCPU_EXIT_CODE or (
+        exit_code == SIGKILL_EXIT_CODE and usage.ru_utime + usage.ru_stime >= limits['cputime']
+    )
+    # Under RLIMIT_AS running out of memory is a failed allocation the solution usually reports
+    oom_killed = not (timed_out or out_of_cpu) and (
+        exit_code == SIGKILL_EXIT_CODE or exit_code != 0 and _out_of_memory(stderr)
+    )
+    return {
+        'exit_code': None if timed_out else exit_code,
+        'stdout': stdout,
+        'stderr': stderr,
+        'output_size': output[process.stdout].size + output[process.stderr].size,
+        'duration': duration,
+        'timeout': timed_out or out_of_cpu,
+        'oom_killed': oom_killed,
+    }
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.celery import app
+from uts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест конвейера проверки: загружает решения через админку и проверяет их '
+        'поддельной средой выполнения, выводит пропускную способность и задержки по этапам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solutions', type=int, default=100, help='Сколько решений загрузить')
+        parser.add_argument('--tasks', type=int, default=5, help='Сколько задач создать')
+        parser.add_argument('--concurrency', type=int, default=8, help='Сколько загрузок выполнять одновременно')
+        parser.add_argument('--run-time', type=float, default=0.5, help='Время работы поддельной среды, с')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Разброс времени работы среды, с')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Доля проваленных решений')
+        parser.add_argument(
+            '--celery', choices=('eager', 'worker'), default='eager',
+            help='eager: задачи выполняются прямо при загрузке; worker: воркер Celery в этом же процессе',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Число потоков воркера в режиме worker')
+        parser.add_argument('--broker', default='memory://', help='Брокер Celery в режиме worker')
+        parser.add_argument('--no-scheduler', action='store_true', help='Отправлять решения в Celery напрямую')
+        parser.add_argument('--timeout', type=int, default=600, help='Сколько ждать проверки всех решений, с')
+
+    def handle(self, *args, solutions, tasks, concurrency, run_time, jitter, fail_rate, celery, workers, broker,
+               no_scheduler, timeout, **options):
+        if solutions < 1 or tasks < 1 or concurrency < 1:
+            raise CommandError('--solutions, --tasks и --concurrency должны быть положительными')
+        if no_scheduler:
+            settings.SCHEDULER_ENABLED = False
+
+        def run():
+            return benchmark.run(solutions, tasks, concurrency, run_time, jitter, fail_rate, timeout)
+
+        if celery == 'eager':
+            app.conf.task_always_eager = True
+            result = run()
+        else:
+            from celery.contrib.testing.worker import start_worker
+
+            # Settings come from the CELERY_ namespace, so the key has to carry it too
+            app.conf.update(CELERY_BROKER_URL=broker)
+            with start_worker(app, concurrency=workers, pool='threads', perform_ping_check=False):
+                result = run()
+
+        self.stdout.write(
+            f'Загружено {result["uploaded"]}, ошибок загрузки {result["upload_errors"]}, '
+            f'проверено {result["checked"]} за {result["wall_time"]:.2f} с, '
+            f'{result["checked"] * 60 / result["wall_time"]:.1f} решений/мин'
+        )
+        self.stdout.write(f'{"этап":<12}' + ''.join(f'{f"p{p}, мс":>12}' for p in benchmark.PERCENTILES))
+        for stage, values in result['durations'].items():
+            cells = []
+            for percent in benchmark.PERCENTILES:
+                value = benchmark.percentile(values, percent)
+                cells.append(f'{"-" if value is None else f"{value * 1000:.1f}":>12}')
+            self.stdout.write(f'{stage:<12}' + ''.join(cells))
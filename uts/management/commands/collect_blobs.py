@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from uts import storage
+from uts.models import Blob, BuildArtifact, CachedResult, Solution, Task
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из хранилища файлы решений, тестов, сборок и логов, на которые больше ничего не ссылается'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60, help='Не трогать файлы, изменённые за последние N минут')
+        parser.add_argument('--recount', action='store_true', help='Сначала пересчитать ссылки по базе данных')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, grace, recount=False, dry_run=False, **options):
+        if recount:
+            self.recount()
+        removed, freed = storage.collect_garbage(timedelta(minutes=grace), dry_run=dry_run)
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(f'{verb} файлов: {removed}, освобождено {freed / 1024 / 1024:.1f} МБ')
+
+    def recount(self):
+        references = {}
+        fields = (
+            (Solution, 'solution_file'), (Solution, 'log_file'), (Task, 'tests_file'),
+            (BuildArtifact, 'artifact_file'), (CachedResult, 'log_file'),
+        )
+        for model, field in fields:
+            for row in model.objects.values(field).annotate(count=Count('pk')).order_by().iterator():
+                digest = storage.digest(row[field])
+                if digest:
+                    references[digest] = references.get(digest, 0) + row['count']
+        fixed = 0
+        for blob in Blob.objects.iterator():
+            count = references.get(blob.digest, 0)
+            if blob.references != count:
+                Blob.objects.filter(pk=blob.pk).update(references=count)
+                fixed += 1
+        self.stdout.write(f'Исправлено счётчиков ссылок: {fixed}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from uts import gradebook
+from uts.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Выгружает результаты решений в CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tasks', nargs='*', help='Названия задач, по умолчанию все задачи')
+        parser.add_argument('--pivot', action='store_true', help='Ведомость: студенты по строкам, задачи по столбцам')
+        parser.add_argument('--output', help='Файл для записи, по умолчанию стандартный вывод')
+
+    def handle(self, *args, tasks, pivot=False, output=None, **options):
+        selected = None
+        if tasks:
+            selected = Task.objects.filter(name__in=tasks).order_by('name')
+            missing = set(tasks) - {task.name for task in selected}
+            if missing:
+                raise CommandError(f'Задачи не найдены: {", ".join(sorted(missing))}')
+        lines = gradebook.export(selected, pivot)
+        if output is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(output, 'w', encoding='utf8', newline='') as f:
+            f.writelines(lines)
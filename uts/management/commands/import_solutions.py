@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from uts.ingest import ArchiveError, ingest_archive
+from uts.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Загружает решения задачи из zip- или tar-архива: путь файла начинается с логина студента'
+
+    def add_arguments(self, parser):
+        parser.add_argument('task', help='Название или идентификатор задачи')
+        parser.add_argument('archive', help='Путь к архиву')
+        parser.add_argument('--batch-size', type=int, help='Сколько решений добавлять и ставить в очередь за раз')
+
+    def handle(self, *args, task, archive, batch_size=None, **options):
+        query = Q(name=task) | Q(pk=task) if task.isdigit() else Q(name=task)
+        found = Task.objects.filter(query).first()
+        if found is None:
+            raise CommandError(f'Задача не найдена: {task}')
+
+        try:
+            with open(archive, 'rb') as fileobj:
+                report = ingest_archive(found, fileobj, archive, batch_size=batch_size)
+        except (OSError, ArchiveError) as e:
+            raise CommandError(str(e))
+
+        for path, reason in report.skipped:
+            self.stderr.write(f'{path}: пропущен, {reason}')
+        self.stdout.write(f'Загружено решений: {report.created}, пропущено файлов: {len(report.skipped)}')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from uts import similarity
+from uts.models import Solution
+
+
+class Command(BaseCommand):
+    help = 'Строит индекс похожих решений для решений, загруженных до его появления'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tasks', nargs='*', help='Названия задач, по умолчанию все задачи')
+
+    def handle(self, *args, tasks, **options):
+        solutions = Solution.objects.filter(fingerprint=None).order_by('pk')
+        if tasks:
+            solutions = solutions.filter(task__name__in=tasks)
+        indexed = found = 0
+        for solution in solutions.iterator():
+            found += similarity.index_solution(solution)
+            indexed += 1
+        self.stdout.write(f'Проиндексировано решений: {indexed}, найдено похожих пар: {found}')
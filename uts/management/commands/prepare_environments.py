@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from epicbox.exceptions import DockerError
+
+from uts import profiles
+from uts.models import Environment
+
+
+class Command(BaseCommand):
+    help = 'Скачивает и проверяет Docker-образы всех сред выполнения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-pull', action='store_true', help='Только проверить наличие образов')
+
+    def handle(self, *args, no_pull=False, **options):
+        missing = []
+        for environment in Environment.objects.filter(sandbox_backend=Environment.DOCKER).order_by('name'):
+            try:
+                image_id = profiles.resolve_image(environment.docker_image, pull=not no_pull)
+            except DockerError as e:
+                missing.append(environment.name)
+                self.stderr.write(f'{environment.name} ({environment.docker_image}): образ недоступен: {e}')
+            else:
+                self.stdout.write(f'{environment.name} ({environment.docker_image}): {image_id}')
+        if missing:
+            raise CommandError(f'Недоступны образы сред выполнения: {", ".join(missing)}')
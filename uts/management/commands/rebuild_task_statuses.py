@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from uts import statuses
+from uts.models import TaskStatus
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статусы задач студентов по всем решениям'
+
+    def handle(self, *args, **options):
+        statuses.rebuild()
+        self.stdout.write(f'Статусов задач: {TaskStatus.objects.count()}')
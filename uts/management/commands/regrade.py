@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from uts.models import Regrade, Task
+from uts.regrade import start_regrade
+
+
+class Command(BaseCommand):
+    help = 'Перепроверяет все решения указанных задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tasks', nargs='+', help='Названия или идентификаторы задач')
+        parser.add_argument('--concurrency', type=int, help='Сколько решений проверять одновременно')
+        parser.add_argument('--low-priority', action='store_true', help='Проверять только когда нет новых решений')
+        parser.add_argument('--wait', action='store_true', help='Дождаться завершения и выводить прогресс')
+
+    def handle(self, *args, tasks, concurrency=None, low_priority=False, wait=False, **options):
+        query = Q(name__in=tasks) | Q(pk__in=[task for task in tasks if task.isdigit()])
+        found = list(Task.objects.filter(query))
+        missing = set(tasks) - {task.name for task in found} - {str(task.pk) for task in found}
+        if missing:
+            raise CommandError(f'Задачи не найдены: {", ".join(sorted(missing))}')
+
+        regrade = start_regrade(found, concurrency=concurrency, low_priority=low_priority)
+        self.stdout.write(f'{regrade}: {regrade.total} решений, {regrade.concurrency} одновременно')
+
+        while wait and regrade.finished_at is None:
+            time.sleep(5)
+            regrade = Regrade.objects.get(pk=regrade.pk)
+            self.stdout.write(
+                f'готово {regrade.done}, провалено {regrade.failed}, осталось {regrade.remaining}, '
+                f'{regrade.throughput:.1f} решений/мин'
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from uts import pool
+
+
+class Command(BaseCommand):
+    help = 'Показывает счётчики пула контейнеров среды выполнения по всем воркерам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счётчики после вывода')
+
+    def handle(self, *args, reset=False, **options):
+        stats = pool.get_stats()
+        if not stats:
+            self.stdout.write('Статистика пула пуста')
+        for image, counters in sorted(stats.items()):
+            hits = int(counters.get('hits', 0))
+            misses = int(counters.get('misses', 0))
+            acquired = hits + misses
+            wait = counters.get('wait_seconds', 0.0)
+            self.stdout.write(
+                f'{image}: hits={hits} misses={misses} '
+                f'hit_ratio={hits / acquired if acquired else 0:.2%} '
+                f'wait_total={wait:.2f}s wait_avg={wait / acquired if acquired else 0:.3f}s '
+                f'recycled={int(counters.get("recycled", 0))}'
+            )
+        if reset:
+            pool.reset_stats()
@@ -0,0 +1,170 @@
+"""Grading metrics in the Prometheus text format.
+
+Celery prefork children and gunicorn workers share no memory, so samples are
+aggregated in Redis, like the pool statistics. A run sends all of its samples
+in one pipelined round trip. Histograms keep per-bucket counts in a hash per
+metric, the buckets are made cumulative when the metrics are rendered.
+"""
+import http.server
+import json
+import logging
+import threading
+
+import redis
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+from uts.utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'uts:metrics:'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SECONDS = 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+BYTES = 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216
+
+HISTOGRAMS = {
+    'uts_queue_wait_seconds': ('Time from enqueueing a solution to the start of its run', SECONDS),
+    'uts_admission_wait_seconds': ('Time a run waited for CPU and memory of the worker host', SECONDS),
+    'uts_sandbox_setup_seconds': ('Sandbox time not spent running the command: start, file upload, cleanup', SECONDS),
+    'uts_build_duration_seconds': ('Run time of the build command in the sandbox, cached builds excluded', SECONDS),
+    'uts_run_duration_seconds': ('Run time of the test command in the sandbox', SECONDS),
+    'uts_output_bytes': ('Size of stdout and stderr of a run', BYTES),
+    'uts_db_save_seconds': ('Time to save the log, the state and the test results of a run', SECONDS),
+}
+COUNTERS = {
+    'uts_runs_total': (
+        'Checked solutions by result: ok, failed, build_failed, timeout, oom, error, cached '
+        'or superseded (deleted during the run)'
+    ),
+}
+
+
+class Batch:
+    """Samples of a single run, sent to Redis at once by ``flush``."""
+
+    def __init__(self, environment, task):
+        self.labels = {'environment': environment.name, 'task': task.name}
+        self.samples = []
+        self.counters = []
+
+    def observe(self, name, value):
+        self.samples.append((name, value))
+
+    def inc(self, name, **labels):
+        self.counters.append((name, labels))
+
+    def flush(self):
+        if not (self.samples or self.counters):
+            return
+        try:
+            pipe = get_redis(decode_responses=True).pipeline(transaction=False)
+            series = json.dumps(self.labels, sort_keys=True)
+            for name, value in self.samples:
+                buckets = HISTOGRAMS[name][1]
+                bucket = next((str(le) for le in buckets if value <= le), '+Inf')
+                pipe.hincrby(KEY_PREFIX + name, f'{series}\t{bucket}', 1)
+                pipe.hincrbyfloat(KEY_PREFIX + name, f'{series}\tsum', value)
+            for name, labels in self.counters:
+                pipe.hincrby(KEY_PREFIX + name, json.dumps({**self.labels, **labels}, sort_keys=True), 1)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning('Failed to record grading metrics', exc_info=True)
+        self.samples, self.counters = [], []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in sorted(labels.items())) + '}'
+
+
+def _render_histogram(lines, name, help_text, buckets, fields):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    series = {}
+    for field, value in fields.items():
+        labels, bucket = field.rsplit('\t', 1)
+        series.setdefault(labels, {})[bucket] = float(value)
+    for labels, values in sorted(series.items()):
+        labels = json.loads(labels)
+        total = 0
+        for le in [*buckets, '+Inf']:
+            total += int(values.get(str(le), 0))
+            lines.append(f'{name}_bucket{_format_labels({**labels, "le": le})} {total}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {values.get("sum", 0.0)!r}')
+        lines.append(f'{name}_count{_format_labels(labels)} {total}')
+
+
+def render():
+    from uts import admission, page_cache, scheduler
+
+    client = get_redis(decode_responses=True)
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        _render_histogram(lines, name, help_text, buckets, client.hgetall(KEY_PREFIX + name))
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for labels, value in sorted(client.hgetall(KEY_PREFIX + name).items()):
+            lines.append(f'{name}{_format_labels(json.loads(labels))} {value}')
+
+    name = 'uts_page_cache_requests_total'
+    lines += [f'# HELP {name} Cacheable student task pages by result: hit or miss', f'# TYPE {name} counter']
+    lines += [f'{name}{_format_labels({"result": result})} {count}' for result, count in page_cache.stats().items()]
+
+    if settings.SCHEDULER_ENABLED:
+        queues = scheduler.stats()
+        for name, help_text, field in (
+            ('uts_scheduler_running', 'Sandbox runs in flight', 'running'),
+            ('uts_scheduler_slots', 'Sandbox slots', 'slots'),
+            ('uts_scheduler_pending', 'Solutions waiting for a sandbox slot', 'pending'),
+            ('uts_scheduler_pending_low', 'Low priority solutions waiting for a sandbox slot', 'pending_low'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            lines += [f'{name}{_format_labels({"class": queue["class"]})} {queue[field]}' for queue in queues]
+    if settings.ADMISSION_ENABLED:
+        hosts = admission.stats()
+        for name, help_text, field in (
+            ('uts_admission_cpus', 'Cores sandbox runs of a worker host may reserve', 'cpus'),
+            ('uts_admission_reserved_cpus', 'Cores reserved by sandbox runs in flight', 'reserved_cpus'),
+            ('uts_admission_memory_megabytes', 'Memory sandbox runs of a worker host may reserve', 'memory'),
+            ('uts_admission_reserved_memory_megabytes', 'Memory reserved by sandbox runs in flight', 'reserved_memory'),
+            ('uts_admission_waiting', 'Sandbox runs waiting for resources of a worker host', 'waiting'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            lines += [f'{name}{_format_labels({"host": host["host"]})} {host[field]}' for host in hosts]
+    return '\n'.join(lines) + '\n'
+
+
+def is_request_allowed(authorization):
+    if not settings.METRICS_TOKEN:
+        return True
+    return constant_time_compare(authorization or '', f'Bearer {settings.METRICS_TOKEN}')
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        if not is_request_allowed(self.headers.get('Authorization')):
+            self.send_error(403)
+            return
+        body = render().encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port):
+    """Serve /metrics from a daemon thread, for processes without a web server."""
+    server = http.server.ThreadingHTTPServer(('0.0.0.0', port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
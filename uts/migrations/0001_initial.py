@@ -7,7 +7,6 @@ from django.db import migrations, models
 import django.db.models.deletion
 import django.utils.timezone
 
-from uts.models import Environment
 
 
 def init_runners(apps, schema_editor):
@@ -37,6 +36,7 @@ def init_runners(apps, schema_editor):
             "solution_filename": "solution"
         }
     ]
+    Environment = apps.get_model('uts', 'Environment')
     Environment.objects.bulk_create(Environment(**fixture) for fixture in fixtures)
 
 
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('state', models.CharField(choices=[('NEW', 'Добавлено'), ('RUN', 'Выполняется'), ('FAI', 'Провалено'), ('COM', 'Завершено успешно')], max_length=3, verbose_name='Состояние')),
+                ('log', models.TextField(blank=True, default='', verbose_name='Лог')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Попаданий')),
+                ('used_at', models.DateTimeField(db_index=True, verbose_name='Последнее использование')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='uts.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Кэшированный результат',
+                'verbose_name_plural': 'кэшированные результаты',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0002_cachedresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Regrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('concurrency', models.PositiveSmallIntegerField(verbose_name='Одновременных запусков')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего решений')),
+                ('done', models.PositiveIntegerField(default=0, verbose_name='Проверено успешно')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Провалено')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Запущено')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('started_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Запущено пользователем')),
+                ('tasks', models.ManyToManyField(to='uts.Task', verbose_name='Задачи')),
+            ],
+            options={
+                'verbose_name': 'Перепроверка',
+                'verbose_name_plural': 'перепроверки',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0003_regrade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedresult',
+            name='test_results',
+            field=models.JSONField(blank=True, default=list, verbose_name='Результаты тестов'),
+        ),
+        migrations.CreateModel(
+            name='TestCaseResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=512, verbose_name='Тест')),
+                ('status', models.CharField(choices=[('passed', 'Пройден'), ('failed', 'Провален'), ('error', 'Ошибка'), ('timeout', 'Превышено время'), ('output_limit', 'Превышен объём вывода'), ('skipped', 'Пропущен')], max_length=16, verbose_name='Результат')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='Длительность (с)')),
+                ('output', models.TextField(blank=True, default='', verbose_name='Вывод')),
+                ('solution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_results', to='uts.solution', verbose_name='Решение')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='uts.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Результат теста',
+                'verbose_name_plural': 'результаты тестов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='testcaseresult',
+            index=models.Index(fields=['task', 'status', 'name'], name='uts_testcas_task_id_9296fe_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0004_testcaseresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedresult',
+            name='log_file',
+            field=models.FileField(blank=True, upload_to='logs', verbose_name='Полный лог'),
+        ),
+        migrations.AddField(
+            model_name='solution',
+            name='log_file',
+            field=models.FileField(blank=True, help_text='Сжатый полный вывод, если он не поместился в лог', upload_to='logs', verbose_name='Полный лог'),
+        ),
+    ]
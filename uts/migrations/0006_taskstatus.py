@@ -0,0 +1,59 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_task_statuses(apps, schema_editor):
+    Solution = apps.get_model('uts', 'Solution')
+    TaskStatus = apps.get_model('uts', 'TaskStatus')
+    rows = Solution.objects.values('author_id', 'task_id').annotate(
+        solved=models.Count('pk', filter=models.Q(state='COM')),
+        checked=models.Count('pk', filter=models.Q(checked=True)),
+    ).order_by()
+    TaskStatus.objects.bulk_create(
+        (
+            TaskStatus(user_id=row['author_id'], task_id=row['task_id'],
+                       solved=bool(row['solved']), checked=bool(row['checked']))
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0005_solution_log_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('solved', models.BooleanField(default=False, verbose_name='Решена')),
+                ('checked', models.BooleanField(default=False, verbose_name='Зачтена')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statuses', to='uts.task', verbose_name='Задача')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Студент')),
+            ],
+            options={
+                'verbose_name': 'Статус задачи студента',
+                'verbose_name_plural': 'статусы задач студентов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='taskstatus',
+            index=models.Index(fields=['user', 'solved', 'task'], name='uts_tasksta_user_id_6166d2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskstatus',
+            index=models.Index(fields=['user', 'checked', 'task'], name='uts_tasksta_user_id_9131fa_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskstatus',
+            constraint=models.UniqueConstraint(fields=('user', 'task'), name='uts_taskstatus_user_task'),
+        ),
+        migrations.RunPython(fill_task_statuses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0006_taskstatus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regrade',
+            name='low_priority',
+            field=models.BooleanField(default=False, help_text='Решения перепроверяются только когда нет новых решений студентов', verbose_name='Низкий приоритет'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0007_regrade_low_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='environment',
+            name='sandbox_backend',
+            field=models.CharField(choices=[('docker', 'Docker-контейнер'), ('local', 'Процесс на воркере')], default='docker', help_text='Процесс на воркере запускается за миллисекунды, но изолирован только лимитами ресурсов и отдельным сетевым пространством имён. Команда выполняется в окружении воркера', max_length=16, verbose_name='Способ запуска'),
+        ),
+        migrations.AlterField(
+            model_name='environment',
+            name='docker_image',
+            field=models.CharField(blank=True, help_text='Не используется при запуске процессом на воркере', max_length=512, verbose_name='Имя Docker-образа'),
+        ),
+    ]
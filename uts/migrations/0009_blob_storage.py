@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:53
+
+from django.db import migrations, models
+import django.utils.timezone
+import uts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0008_environment_sandbox_backend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(verbose_name='Размер')),
+                ('references', models.IntegerField(default=0, verbose_name='Ссылок')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменён')),
+            ],
+            options={
+                'verbose_name': 'Файл в хранилище',
+                'verbose_name_plural': 'файлы в хранилище',
+            },
+        ),
+        migrations.AlterField(
+            model_name='solution',
+            name='solution_file',
+            field=models.FileField(storage=uts.storage.ContentAddressedStorage(), upload_to='uploads', verbose_name='Файл с решением'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='tests_file',
+            field=models.FileField(storage=uts.storage.ContentAddressedStorage(), upload_to='uploads', verbose_name='Файл с тестами для задачи'),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['references', 'updated_at'], name='uts_blob_referen_f67ae7_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0009_blob_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolutionFingerprint',
+            fields=[
+                ('solution', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='uts.solution', verbose_name='Решение')),
+                ('hashes', models.BinaryField(verbose_name='Отпечатки')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='uts.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Отпечаток решения',
+                'verbose_name_plural': 'отпечатки решений',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarityMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField(verbose_name='Сходство')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='uts.solution', verbose_name='Похожее решение')),
+                ('solution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_matches', to='uts.solution', verbose_name='Решение')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='uts.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Похожие решения',
+                'verbose_name_plural': 'похожие решения',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarityBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Полоса')),
+                ('value', models.BigIntegerField(verbose_name='Хеш')),
+                ('solution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='uts.solution', verbose_name='Решение')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='uts.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Полоса сигнатуры',
+                'verbose_name_plural': 'полосы сигнатур',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='similaritymatch',
+            index=models.Index(fields=['task', '-similarity'], name='uts_similar_task_id_77e885_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='similaritymatch',
+            constraint=models.UniqueConstraint(fields=('solution', 'other'), name='uts_similaritymatch_solution_other'),
+        ),
+        migrations.AddIndex(
+            model_name='similarityband',
+            index=models.Index(fields=['task', 'band', 'value'], name='uts_similar_task_id_b38266_idx'),
+        ),
+    ]
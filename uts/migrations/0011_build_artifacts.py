@@ -0,0 +1,43 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0010_similarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='environment',
+            name='build_artifact',
+            field=models.CharField(blank=True, help_text='Файл, который создаёт команда сборки и который передаётся тестам вместе с решением', max_length=512, verbose_name='Имя результата сборки'),
+        ),
+        migrations.AddField(
+            model_name='environment',
+            name='build_command',
+            field=models.CharField(blank=True, help_text='Выполняется перед тестами в каталоге с файлом-решением. Результат сборки кэшируется по содержимому решения и образу, поэтому одинаковые решения собираются один раз', max_length=512, verbose_name='Команда сборки'),
+        ),
+        migrations.CreateModel(
+            name='BuildArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('success', models.BooleanField(verbose_name='Собрано')),
+                ('artifact_file', models.FileField(blank=True, storage=uts.storage.ContentAddressedStorage(), upload_to='builds', verbose_name='Результат сборки')),
+                ('log', models.TextField(blank=True, default='', verbose_name='Вывод сборки')),
+                ('duration', models.FloatField(verbose_name='Длительность (с)')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Попаданий')),
+                ('used_at', models.DateTimeField(db_index=True, verbose_name='Последнее использование')),
+                ('environment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='uts.environment', verbose_name='Среда выполнения')),
+            ],
+            options={
+                'verbose_name': 'Результат сборки',
+                'verbose_name_plural': 'результаты сборки',
+            },
+        ),
+    ]
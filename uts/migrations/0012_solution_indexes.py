@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0011_build_artifacts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['author', 'task'], name='uts_solutio_author__6a714b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['task', 'state'], name='uts_solutio_task_id_5e1270_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['-created_at', '-id'], name='uts_solutio_created_d8dbeb_idx'),
+        ),
+    ]
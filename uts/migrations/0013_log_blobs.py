@@ -0,0 +1,24 @@
+# Generated by Django 3.2.3 on 2026-10-18 11:20
+
+from django.db import migrations, models
+import uts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uts', '0012_solution_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cachedresult',
+            name='log_file',
+            field=models.FileField(blank=True, storage=uts.storage.ContentAddressedStorage(), upload_to='logs', verbose_name='Полный лог'),
+        ),
+        migrations.AlterField(
+            model_name='solution',
+            name='log_file',
+            field=models.FileField(blank=True, help_text='Сжатый полный вывод, если он не поместился в лог', storage=uts.storage.ContentAddressedStorage(), upload_to='logs', verbose_name='Полный лог'),
+        ),
+    ]
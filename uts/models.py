@@ -1,8 +1,11 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from uts.storage import blob_storage
 from uts.utils import get_student_group
 
 
@@ -16,6 +19,9 @@ class User(AbstractUser):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'is_student' not in update_fields:
+            return
         student_group = get_student_group()
         if self.is_student:
             self.groups.add(student_group)
@@ -24,19 +30,50 @@ class User(AbstractUser):
 
 
 class Environment(models.Model):
+    DOCKER = 'docker'
+    LOCAL = 'local'
+    SANDBOX_BACKEND_CHOICES = (
+        (DOCKER, 'Docker-контейнер'),
+        (LOCAL, 'Процесс на воркере'),
+    )
+
     name = models.CharField(max_length=512, verbose_name='Название', unique=True)
     description = models.TextField(
         verbose_name='Описание',
         help_text='Инструкция по использованию данной среды выполнения'
     )
-    docker_image = models.CharField(max_length=512, verbose_name='Имя Docker-образа')
+    sandbox_backend = models.CharField(
+        max_length=16, choices=SANDBOX_BACKEND_CHOICES, default=DOCKER,
+        verbose_name='Способ запуска',
+        help_text='Процесс на воркере запускается за миллисекунды, но изолирован только лимитами ресурсов '
+                  'и отдельным сетевым пространством имён. Команда выполняется в окружении воркера'
+    )
+    docker_image = models.CharField(
+        max_length=512, blank=True, verbose_name='Имя Docker-образа',
+        help_text='Не используется при запуске процессом на воркере'
+    )
     command = models.CharField(max_length=512, verbose_name='Команда для запуска тестов')
     tests_filename = models.CharField(max_length=512, verbose_name='Имя файла с тестами')
     solution_filename = models.CharField(max_length=512, verbose_name='Имя файла-решения')
+    build_command = models.CharField(
+        max_length=512, blank=True, verbose_name='Команда сборки',
+        help_text='Выполняется перед тестами в каталоге с файлом-решением. Результат сборки кэшируется '
+                  'по содержимому решения и образу, поэтому одинаковые решения собираются один раз'
+    )
+    build_artifact = models.CharField(
+        max_length=512, blank=True, verbose_name='Имя результата сборки',
+        help_text='Файл, который создаёт команда сборки и который передаётся тестам вместе с решением'
+    )
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.sandbox_backend == self.DOCKER and not self.docker_image:
+            raise ValidationError({'docker_image': 'Для запуска в Docker-контейнере нужен образ'})
+        if self.build_command and not self.build_artifact:
+            raise ValidationError({'build_artifact': 'Укажите файл, который создаёт команда сборки'})
+
     class Meta:
         verbose_name = 'Среда выполнения'
         verbose_name_plural = 'среды выполнения'
@@ -61,7 +98,7 @@ class Task(models.Model):
     )
     
     tests_file = models.FileField(
-        upload_to='uploads',
+        upload_to='uploads', storage=blob_storage,
         verbose_name='Файл с тестами для задачи'
     )
     environment = models.ForeignKey(
@@ -91,7 +128,7 @@ class Solution(models.Model):
     )
 
     solution_file = models.FileField(
-        upload_to='uploads',
+        upload_to='uploads', storage=blob_storage,
         verbose_name='Файл с решением',
     )
     task = models.ForeignKey(
@@ -110,6 +147,11 @@ class Solution(models.Model):
         default='', blank=True,
         verbose_name='Лог',
     )
+    log_file = models.FileField(
+        upload_to='logs', storage=blob_storage, blank=True,
+        verbose_name='Полный лог',
+        help_text='Сжатый полный вывод, если он не поместился в лог',
+    )
 
     created_at = models.DateTimeField(
         auto_created=True,
@@ -121,6 +163,241 @@ class Solution(models.Model):
     class Meta:
         verbose_name = 'Решение'
         verbose_name_plural = 'решения'
+        indexes = [
+            models.Index(fields=['author', 'task']),
+            models.Index(fields=['task', 'state']),
+            models.Index(fields=['-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f'Решение задачи "{self.task}" студентом {self.author}'
+
+
+class TaskStatus(models.Model):
+    """Per-student summary of all solutions of a task, kept in sync by signals."""
+    user = models.ForeignKey(
+        to=get_user_model(), on_delete=models.CASCADE,
+        verbose_name='Студент',
+    )
+    task = models.ForeignKey(
+        to=Task, on_delete=models.CASCADE, related_name='statuses',
+        verbose_name='Задача',
+    )
+    solved = models.BooleanField(default=False, verbose_name='Решена')
+    checked = models.BooleanField(default=False, verbose_name='Зачтена')
+
+    class Meta:
+        verbose_name = 'Статус задачи студента'
+        verbose_name_plural = 'статусы задач студентов'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'task'], name='uts_taskstatus_user_task'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'solved', 'task']),
+            models.Index(fields=['user', 'checked', 'task']),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.task}'
+
+
+class TestCaseResult(models.Model):
+    PASSED = 'passed'
+    FAILED = 'failed'
+    ERROR = 'error'
+    TIMEOUT = 'timeout'
+    OUTPUT_LIMIT = 'output_limit'
+    SKIPPED = 'skipped'
+    STATUS_CHOICES = (
+        (PASSED, _('Пройден')),
+        (FAILED, _('Провален')),
+        (ERROR, _('Ошибка')),
+        (TIMEOUT, _('Превышено время')),
+        (OUTPUT_LIMIT, _('Превышен объём вывода')),
+        (SKIPPED, _('Пропущен')),
+    )
+
+    solution = models.ForeignKey(
+        to=Solution, on_delete=models.CASCADE, related_name='test_results',
+        verbose_name='Решение',
+    )
+    # Denormalized from solution so per-task statistics don't need a join
+    task = models.ForeignKey(
+        to=Task, on_delete=models.CASCADE,
+        verbose_name='Задача',
+    )
+    name = models.CharField(max_length=512, verbose_name='Тест')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, verbose_name='Результат')
+    duration = models.FloatField(null=True, blank=True, verbose_name='Длительность (с)')
+    output = models.TextField(default='', blank=True, verbose_name='Вывод')
+
+    class Meta:
+        verbose_name = 'Результат теста'
+        verbose_name_plural = 'результаты тестов'
+        indexes = [
+            models.Index(fields=['task', 'status', 'name']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Blob(models.Model):
+    digest = models.CharField(max_length=64, primary_key=True, verbose_name='SHA-256')
+    size = models.BigIntegerField(verbose_name='Размер')
+    references = models.IntegerField(default=0, verbose_name='Ссылок')
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='Изменён')
+
+    class Meta:
+        verbose_name = 'Файл в хранилище'
+        verbose_name_plural = 'файлы в хранилище'
+        indexes = [
+            models.Index(fields=['references', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return self.digest
+
+
+class BuildArtifact(models.Model):
+    key = models.CharField(max_length=64, unique=True, verbose_name='Ключ')
+    environment = models.ForeignKey(
+        to=Environment, on_delete=models.CASCADE,
+        verbose_name='Среда выполнения',
+    )
+    success = models.BooleanField(verbose_name='Собрано')
+    artifact_file = models.FileField(
+        upload_to='builds', storage=blob_storage, blank=True,
+        verbose_name='Результат сборки',
+    )
+    log = models.TextField(default='', blank=True, verbose_name='Вывод сборки')
+    duration = models.FloatField(verbose_name='Длительность (с)')
+    hits = models.PositiveIntegerField(default=0, verbose_name='Попаданий')
+    used_at = models.DateTimeField(db_index=True, verbose_name='Последнее использование')
+
+    class Meta:
+        verbose_name = 'Результат сборки'
+        verbose_name_plural = 'результаты сборки'
+
+    def __str__(self):
+        return f'Сборка {self.key[:12]} в среде "{self.environment}"'
+
+
+class CachedResult(models.Model):
+    key = models.CharField(max_length=64, unique=True, verbose_name='Ключ')
+    task = models.ForeignKey(
+        to=Task, on_delete=models.CASCADE,
+        verbose_name='Задача',
+    )
+    state = models.CharField(
+        max_length=3, choices=Solution.STATE_CHOICES,
+        verbose_name='Состояние',
+    )
+    log = models.TextField(default='', blank=True, verbose_name='Лог')
+    log_file = models.FileField(upload_to='logs', storage=blob_storage, blank=True, verbose_name='Полный лог')
+    test_results = models.JSONField(default=list, blank=True, verbose_name='Результаты тестов')
+    hits = models.PositiveIntegerField(default=0, verbose_name='Попаданий')
+    used_at = models.DateTimeField(db_index=True, verbose_name='Последнее использование')
+
+    class Meta:
+        verbose_name = 'Кэшированный результат'
+        verbose_name_plural = 'кэшированные результаты'
+
+    def __str__(self):
+        return f'Результат {self.key[:12]} для задачи "{self.task}"'
+
+
+class Regrade(models.Model):
+    tasks = models.ManyToManyField(to=Task, verbose_name='Задачи')
+    started_by = models.ForeignKey(
+        to=get_user_model(), on_delete=models.SET_NULL, null=True, blank=True,
+        verbose_name='Запущено пользователем',
+    )
+    concurrency = models.PositiveSmallIntegerField(verbose_name='Одновременных запусков')
+    low_priority = models.BooleanField(
+        default=False,
+        verbose_name='Низкий приоритет',
+        help_text='Решения перепроверяются только когда нет новых решений студентов',
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name='Всего решений')
+    done = models.PositiveIntegerField(default=0, verbose_name='Проверено успешно')
+    failed = models.PositiveIntegerField(default=0, verbose_name='Провалено')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Запущено')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершено')
+
+    class Meta:
+        verbose_name = 'Перепроверка'
+        verbose_name_plural = 'перепроверки'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'Перепроверка #{self.pk}'
+
+    @property
+    def remaining(self):
+        return self.total - self.done - self.failed
+
+    @property
+    def throughput(self):
+        elapsed = ((self.finished_at or timezone.now()) - self.created_at).total_seconds()
+        return (self.done + self.failed) * 60 / elapsed if elapsed > 0 else 0.0
+
+
+class SolutionFingerprint(models.Model):
+    """Winnowed token fingerprints of a solution, see uts.similarity."""
+    solution = models.OneToOneField(
+        to=Solution, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint',
+        verbose_name='Решение',
+    )
+    # Denormalized from solution so the candidates of a task are found without a join
+    task = models.ForeignKey(
+        to=Task, on_delete=models.CASCADE,
+        verbose_name='Задача',
+    )
+    hashes = models.BinaryField(verbose_name='Отпечатки')
+
+    class Meta:
+        verbose_name = 'Отпечаток решения'
+        verbose_name_plural = 'отпечатки решений'
+
+
+class SimilarityBand(models.Model):
+    """One band of the MinHash signature of a solution, the LSH index of a task."""
+    task = models.ForeignKey(to=Task, on_delete=models.CASCADE, verbose_name='Задача')
+    solution = models.ForeignKey(to=Solution, on_delete=models.CASCADE, verbose_name='Решение')
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    value = models.BigIntegerField(verbose_name='Хеш')
+
+    class Meta:
+        verbose_name = 'Полоса сигнатуры'
+        verbose_name_plural = 'полосы сигнатур'
+        indexes = [
+            models.Index(fields=['task', 'band', 'value']),
+        ]
+
+
+class SimilarityMatch(models.Model):
+    task = models.ForeignKey(to=Task, on_delete=models.CASCADE, verbose_name='Задача')
+    # The later solution of the pair
+    solution = models.ForeignKey(
+        to=Solution, on_delete=models.CASCADE, related_name='similar_matches',
+        verbose_name='Решение',
+    )
+    other = models.ForeignKey(
+        to=Solution, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Похожее решение',
+    )
+    similarity = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожие решения'
+        verbose_name_plural = 'похожие решения'
+        constraints = [
+            models.UniqueConstraint(fields=['solution', 'other'], name='uts_similaritymatch_solution_other'),
+        ]
+        indexes = [
+            models.Index(fields=['task', '-similarity']),
+        ]
+
+    def __str__(self):
+        return f'{self.solution} ~ {self.other}: {self.similarity:.0%}'
@@ -0,0 +1,63 @@
+import gzip
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+# Bytes of the end of a stream kept past the capture limit: runners print their summary last
+CAPTURE_TAIL = 256 * 1024
+
+
+class Capture:
+    """Output of a stream kept within about ``limit`` bytes: its head and its last ``CAPTURE_TAIL`` bytes."""
+
+    def __init__(self, limit=None):
+        self.limit = settings.SANDBOX_OUTPUT_CAPTURE_LIMIT if limit is None else limit
+        self.tail_size = min(CAPTURE_TAIL, self.limit // 2)
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.skipped = 0
+        # Bytes written, kept or not
+        self.size = 0
+
+    def write(self, chunk):
+        """Keeps the chunk, returns the part of it that went to the head."""
+        self.size += len(chunk)
+        room = self.limit - self.tail_size - len(self.head)
+        kept = chunk[:max(0, room)]
+        self.head += kept
+        self.tail += chunk[len(kept):]
+        if len(self.tail) > self.tail_size:
+            excess = len(self.tail) - self.tail_size
+            del self.tail[:excess]
+            self.skipped += excess
+        return kept
+
+    def getvalue(self):
+        if not self.skipped:
+            return bytes(self.head + self.tail)
+        marker = f'\n… пропущено байт: {self.skipped} …\n'.encode('utf8')
+        return bytes(self.head) + marker + bytes(self.tail)
+
+
+def capture(data, limit=None):
+    output = Capture(limit)
+    output.write(data)
+    return output.getvalue()
+
+
+def head_tail(text, limit=None):
+    limit = settings.SOLUTION_LOG_OUTPUT_LIMIT if limit is None else limit
+    if len(text) <= limit:
+        return text, False
+    head = limit // 2
+    tail = limit - head
+    skipped = len(text) - limit
+    return f'{text[:head]}\n\n… пропущено символов: {skipped}, полный лог доступен по ссылке …\n\n{text[-tail:]}', True
+
+
+def compress(name, text):
+    return ContentFile(gzip.compress(text.encode('utf8')), name=f'{name}.log.gz')
+
+
+def open_log(file):
+    return gzip.open(file.open('rb'))
@@ -0,0 +1,103 @@
+"""Rendered task pages of students, cached in Redis.
+
+Students reload the task list and the pages of tasks most of all, and those
+only change with a task, an environment or one of the student's own
+solutions. A page is cached per session, because the HTML holds the CSRF token
+and the user name. Its key includes generation counters: signals bump the
+counter of a task, of all tasks or of a student, and the entries under the old
+generations simply expire.
+"""
+import hashlib
+import logging
+
+import redis
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db import transaction
+from django.http import HttpResponse
+
+from uts.utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'uts:pages:'
+STATS_KEY = KEY_PREFIX + 'stats'
+
+
+def _generation_keys(user_id, task_id):
+    scope = f'task:{task_id}' if task_id is not None else 'tasks'
+    return [KEY_PREFIX + 'generation:all', KEY_PREFIX + f'generation:{scope}', KEY_PREFIX + f'generation:user:{user_id}']
+
+
+def _is_cacheable(request):
+    return (
+        settings.PAGE_CACHE_TTL
+        and request.method == 'GET'
+        and request.user.is_student
+        and request.session.session_key
+        # A page with messages is shown once
+        and not len(get_messages(request))
+    )
+
+
+def cached(request, render, task_id=None):
+    """Returns the cached page or the response of ``render``, caching it.
+
+    ``task_id`` is the task of a task page, None for the task list.
+    """
+    if not _is_cacheable(request):
+        return render()
+    try:
+        client = get_redis()
+        generations = client.mget(_generation_keys(request.user.pk, task_id))
+        parts = [request.session.session_key, request.get_full_path()]
+        parts += [generation.decode() if generation else '0' for generation in generations]
+        key = KEY_PREFIX + hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+        content = client.get(key)
+        client.hincrby(STATS_KEY, 'miss' if content is None else 'hit', 1)
+    except redis.RedisError:
+        logger.warning('Failed to read the page cache', exc_info=True)
+        return render()
+    if content is not None:
+        return HttpResponse(content)
+
+    response = render()
+    if response.status_code == 200 and hasattr(response, 'render'):
+        response.render()
+        try:
+            client.set(key, response.content, ex=settings.PAGE_CACHE_TTL)
+        except redis.RedisError:
+            logger.warning('Failed to write the page cache', exc_info=True)
+    return response
+
+
+def _bump(names):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for name in names:
+            pipe.incr(KEY_PREFIX + f'generation:{name}')
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning('Failed to invalidate the page cache', exc_info=True)
+
+
+def invalidate(task_id=None, user_id=None, everything=False):
+    """Drops cached pages of a task, of a student or all of them once the transaction commits."""
+    names = []
+    if everything:
+        names.append('all')
+    if task_id is not None:
+        names += [f'task:{task_id}', 'tasks']
+    if user_id is not None:
+        names.append(f'user:{user_id}')
+    # Bumped earlier, a concurrent request could cache the old data under the new generation
+    transaction.on_commit(lambda: _bump(names))
+
+
+def stats():
+    try:
+        counts = get_redis().hgetall(STATS_KEY)
+    except redis.RedisError:
+        logger.warning('Failed to read page cache statistics', exc_info=True)
+        counts = {}
+    return {result: int(counts.get(result.encode(), 0)) for result in ('hit', 'miss')}
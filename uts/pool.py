@@ -0,0 +1,303 @@
+import logging
+import tarfile
+import threading
+import time
+import uuid
+from collections import deque
+
+import redis
+from django.conf import settings
+from docker.errors import DockerException, NotFound
+from epicbox import utils as epicbox_utils
+from epicbox.config import DOCKER_WORKDIR
+from epicbox.exceptions import DockerError
+from requests.exceptions import RequestException
+
+from uts import inputs
+from uts.output import Capture
+from uts.utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_PREFIX = 'uts-pool-'
+STATS_KEY_PREFIX = 'uts:pool:'
+
+# The keeper process of an idle container takes one pid of the limit
+PROCESSES_LIMIT = 15
+KEEPER_COMMAND = ['/bin/sh', '-c', 'exec tail -f /dev/null']
+
+SIGKILL_EXIT_CODE = 128 + 9
+SIGXCPU_EXIT_CODE = 128 + 24
+
+# Seconds between checks whether a run was cancelled
+CANCEL_CHECK_INTERVAL = 1
+
+
+def _record(image, **counters):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for name, value in counters.items():
+            if isinstance(value, float):
+                pipe.hincrbyfloat(STATS_KEY_PREFIX + image, name, value)
+            else:
+                pipe.hincrby(STATS_KEY_PREFIX + image, name, value)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning('Failed to record sandbox pool stats for %s', image, exc_info=True)
+
+
+def get_stats():
+    client = get_redis()
+    result = {}
+    for key in client.scan_iter(STATS_KEY_PREFIX + '*'):
+        image = key.decode()[len(STATS_KEY_PREFIX):]
+        result[image] = {name.decode(): float(value) for name, value in client.hgetall(key).items()}
+    return result
+
+
+def reset_stats():
+    client = get_redis()
+    for key in client.scan_iter(STATS_KEY_PREFIX + '*'):
+        client.delete(key)
+
+
+def _start_container(image):
+    client = epicbox_utils.get_docker_client()
+    try:
+        return client.containers.run(
+            image,
+            command=KEEPER_COMMAND,
+            name=CONTAINER_PREFIX + str(uuid.uuid4()),
+            labels={'uts.pool': image},
+            detach=True,
+            network_disabled=True,
+            working_dir=DOCKER_WORKDIR,
+            pids_limit=PROCESSES_LIMIT + 1,
+            log_config={'type': 'none'},
+        )
+    except (RequestException, DockerException) as e:
+        raise DockerError(str(e))
+
+
+def _remove_container(container):
+    try:
+        container.remove(v=True, force=True)
+    except NotFound:
+        pass
+    except (RequestException, DockerException):
+        logger.warning('Failed to remove pooled container %s', container.name, exc_info=True)
+
+
+def _tar_stream(files):
+    """Yields a tar archive of the files chunk by chunk, without building it in memory."""
+    mtime = int(time.time())
+    for file in files:
+        info = tarfile.TarInfo(name=file['name'])
+        info.size = inputs.size(file)
+        info.mode = inputs.mode(file)
+        info.mtime = mtime
+        yield info.tobuf()
+        yield from inputs.chunks(file)
+        if info.size % tarfile.BLOCKSIZE:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE)
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def _put_files(container, files):
+    # A generator is sent with chunked transfer encoding
+    container.client.api.put_archive(container.id, DOCKER_WORKDIR, _tar_stream(files))
+
+
+class SandboxPool:
+    """Pre-started, network-disabled containers of a single image.
+
+    Every container serves exactly one run and is then recycled: it is removed
+    and replaced in the background, so a submission never sees files or
+    processes left over by another one.
+    """
+
+    def __init__(self, image, min_size, max_size):
+        self.image = image
+        self.min_size = min_size
+        self.max_size = max_size
+        self._idle = deque()
+        self._size = 0
+        self._creating = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        started_at = time.monotonic()
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                self._cond.wait()
+            if self._idle:
+                container = self._idle.popleft()
+            else:
+                container = None
+                self._size += 1
+        waited = time.monotonic() - started_at
+        _record(self.image, hits=int(container is not None), misses=int(container is None), wait_seconds=waited)
+
+        if container is None:
+            try:
+                container = _start_container(self.image)
+            except DockerError:
+                self._forget()
+                raise
+        return container
+
+    def release(self, container):
+        threading.Thread(target=self._recycle, args=(container,), daemon=True).start()
+
+    def fill(self):
+        while True:
+            with self._cond:
+                if len(self._idle) + self._creating >= self.min_size or self._size >= self.max_size:
+                    return
+                self._size += 1
+                self._creating += 1
+            try:
+                container = _start_container(self.image)
+            except DockerError:
+                logger.exception('Failed to pre-start a container for %s', self.image)
+                with self._cond:
+                    self._creating -= 1
+                self._forget()
+                return
+            with self._cond:
+                self._creating -= 1
+                self._idle.append(container)
+                self._cond.notify()
+
+    def fill_async(self):
+        threading.Thread(target=self.fill, daemon=True).start()
+
+    def drain(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for container in idle:
+            _remove_container(container)
+            self._forget()
+
+    def _recycle(self, container):
+        _remove_container(container)
+        _record(self.image, recycled=1)
+        self._forget()
+        self.fill()
+
+    def _forget(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def run(self, command, files, limits, on_output=None, cancelled=None):
+        container = self.acquire()
+        try:
+            return self._exec(container, command, files, limits, on_output, cancelled)
+        finally:
+            self.release(container)
+
+    def _exec(self, container, command, files, limits, on_output=None, cancelled=None):
+        memory = f'{limits["memory"]}m'
+        cputime = limits['cputime']
+        try:
+            container.update(mem_limit=memory, memswap_limit=memory)
+            _put_files(container, files)
+            # SIGXCPU at the soft limit, SIGKILL a second later if it is ignored
+            exec_id = container.client.api.exec_create(
+                container.id,
+                ['/bin/sh', '-c', f'ulimit -S -t {cputime}; ulimit -H -t {cputime + 1}; {command}'],
+                workdir=DOCKER_WORKDIR,
+            )['Id']
+        except (RequestException, DockerException) as e:
+            raise DockerError(str(e))
+
+        output = {'stdout': Capture(), 'stderr': Capture()}
+
+        def communicate():
+            try:
+                for chunks in container.client.api.exec_start(exec_id, stream=True, demux=True):
+                    # Past the limit the stream is still drained, only its tail is kept
+                    for stream, chunk in zip(('stdout', 'stderr'), chunks):
+                        if chunk and output[stream].write(chunk) and on_output is not None:
+                            on_output(stream, chunk)
+            except (RequestException, DockerException) as e:
+                output['error'] = e
+
+        started_at = time.monotonic()
+        thread = threading.Thread(target=communicate, daemon=True)
+        thread.start()
+        deadline = started_at + limits['realtime']
+        stopped = False
+        while thread.is_alive() and not stopped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            thread.join(min(remaining, CANCEL_CHECK_INTERVAL))
+            stopped = cancelled is not None and thread.is_alive() and cancelled()
+        duration = time.monotonic() - started_at
+
+        timed_out = thread.is_alive() and not stopped
+        if thread.is_alive():
+            # Killing the container ends the exec stream; it is recycled anyway
+            _remove_container(container)
+            thread.join()
+
+        report = {
+            'exit_code': None,
+            'stdout': output['stdout'].getvalue(),
+            'stderr': output['stderr'].getvalue(),
+            'output_size': output['stdout'].size + output['stderr'].size,
+            'duration': duration,
+            'timeout': timed_out,
+            'oom_killed': False,
+        }
+        # The report of a cancelled run is thrown away
+        if timed_out or stopped:
+            return report
+        if 'error' in output:
+            raise DockerError(str(output['error']))
+
+        try:
+            exit_code = container.client.api.exec_inspect(exec_id)['ExitCode']
+            oom_killed = False
+            if exit_code in (SIGKILL_EXIT_CODE, SIGXCPU_EXIT_CODE):
+                # The container serves this run only, so an OOM kill in it is this run's
+                container.reload()
+                oom_killed = container.attrs['State']['OOMKilled']
+        except (RequestException, DockerException) as e:
+            raise DockerError(str(e))
+        # Like epicbox: SIGKILL or SIGXCPU not sent by the OOM killer is the CPU limit
+        report.update(
+            exit_code=exit_code,
+            timeout=exit_code in (SIGKILL_EXIT_CODE, SIGXCPU_EXIT_CODE) and not oom_killed,
+            oom_killed=oom_killed,
+        )
+        return report
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(image):
+    with _pools_lock:
+        if image not in _pools:
+            _pools[image] = SandboxPool(image, settings.SANDBOX_POOL_MIN_SIZE, settings.SANDBOX_POOL_MAX_SIZE)
+        return _pools[image]
+
+
+def run(image, command, files, limits, on_output=None, cancelled=None):
+    return get_pool(image).run(command, files, limits, on_output, cancelled)
+
+
+def warm_up(images):
+    for image in images:
+        get_pool(image).fill_async()
+
+
+def shutdown():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.drain()
@@ -0,0 +1,65 @@
+import threading
+from collections import namedtuple
+
+import epicbox
+from docker.errors import DockerException, ImageNotFound
+from epicbox import utils as epicbox_utils
+from epicbox.exceptions import DockerError
+from requests.exceptions import RequestException
+
+SandboxProfile = namedtuple('SandboxProfile', 'name docker_image image_id snapshot')
+
+_profiles = {}
+_lock = threading.Lock()
+
+
+def _snapshot(environment):
+    return environment.docker_image, environment.command, environment.solution_filename, environment.tests_filename
+
+
+def resolve_image(image, pull=False):
+    client = epicbox_utils.get_docker_client()
+    try:
+        try:
+            return client.images.get(image).id
+        except ImageNotFound:
+            if not pull:
+                raise
+            return client.images.pull(image).id
+    except (RequestException, DockerException) as e:
+        raise DockerError(str(e))
+
+
+def get_profile(environment):
+    """Epicbox profile of the environment, configured once per worker process.
+
+    A profile is rebuilt when the environment row no longer matches it, so edits
+    made in the admin reach workers without a restart.
+    """
+    snapshot = _snapshot(environment)
+    profile = _profiles.get(environment.pk)
+    if profile is not None and profile.snapshot == snapshot:
+        return profile
+
+    with _lock:
+        profile = _profiles.get(environment.pk)
+        if profile is None or profile.snapshot != snapshot:
+            profile = SandboxProfile(
+                name=f'environment-{environment.pk}',
+                docker_image=environment.docker_image,
+                image_id=resolve_image(environment.docker_image),
+                snapshot=snapshot,
+            )
+            epicbox.configure(profiles=[
+                epicbox.Profile(profile.name, profile.docker_image, read_only=False, network_disabled=True)
+            ])
+            _profiles[environment.pk] = profile
+    return profile
+
+
+def invalidate(environment_id=None):
+    with _lock:
+        if environment_id is None:
+            _profiles.clear()
+        else:
+            _profiles.pop(environment_id, None)
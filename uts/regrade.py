@@ -0,0 +1,57 @@
+from celery import chain
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from uts import page_cache, scheduler, statuses, storage
+from uts.models import Regrade, Solution, TestCaseResult
+from uts.tasks import regrade_solution
+
+
+def start_regrade(tasks, started_by=None, concurrency=None, low_priority=False):
+    """Re-run every solution of the given tasks.
+
+    No more than ``concurrency`` sandboxes of the regrade run at once: with the
+    scheduler it is the in-flight limit of the regrade, otherwise solutions are
+    split into that many lanes, each lane being a Celery chain.
+    """
+    concurrency = max(1, concurrency or settings.REGRADE_CONCURRENCY)
+    tasks = list(tasks)
+    with transaction.atomic():
+        solutions = Solution.objects.filter(task__in=tasks)
+        solution_rows = list(solutions.order_by('pk').values_list('pk', 'task_id'))
+        regrade = Regrade.objects.create(
+            started_by=started_by,
+            concurrency=concurrency,
+            low_priority=low_priority,
+            total=len(solution_rows),
+            finished_at=None if solution_rows else timezone.now(),
+        )
+        regrade.tasks.set(tasks)
+        # update() does not send post_save, so nothing is enqueued behind the regrade's back;
+        # the old results are dropped here, signals would not do it either
+        storage.remove_references(list(solutions.exclude(log_file='').values_list('log_file', flat=True)))
+        solutions.update(state=Solution.NEW, log='', log_file='')
+        TestCaseResult.objects.filter(task__in=tasks).delete()
+        statuses.rebuild(tasks=tasks)
+        for task in tasks:
+            page_cache.invalidate(task_id=task.pk)
+
+        if settings.SCHEDULER_ENABLED:
+            tasks_by_id = {task.pk: task for task in tasks}
+            priority = scheduler.LOW if low_priority else scheduler.NORMAL
+            jobs = [
+                scheduler.make_job(pk, tasks_by_id[task_id], f'regrade:{regrade.pk}', concurrency, priority, regrade.pk)
+                for pk, task_id in solution_rows
+            ]
+            if jobs:
+                transaction.on_commit(lambda: scheduler.enqueue(jobs))
+        else:
+            solution_ids = [pk for pk, _ in solution_rows]
+            lanes = [solution_ids[i::concurrency] for i in range(concurrency)]
+            for lane in lanes:
+                if lane:
+                    transaction.on_commit(
+                        lambda lane=lane: chain(regrade_solution.si(regrade.pk, pk) for pk in lane).delay()
+                    )
+    return regrade
@@ -0,0 +1,137 @@
+import json
+import re
+import xml.etree.ElementTree as ElementTree
+
+from uts.models import TestCaseResult
+
+OUTPUT_LIMIT = 2000
+
+PLAINRUNNER_SUMMARY = re.compile(r'^##uts-summary## (.*)$', re.MULTILINE)
+JUNIT_XML = re.compile(r'<testsuites?[\s>].*</testsuites?>', re.DOTALL)
+GTEST_RESULT = re.compile(r'^\[\s+(OK|FAILED)\s+\] (\S+) \((\d+) ms\)$', re.MULTILINE)
+GTEST_RUN = re.compile(r'^\[ RUN\s+\] (\S+)$', re.MULTILINE)
+UNITTEST_VERBOSE = re.compile(
+    r'^(\w+) \(([\w.]+)\)[^\n]*? \.\.\. (ok|FAIL|ERROR|skipped|expected failure|unexpected success)',
+    re.MULTILINE,
+)
+UNITTEST_PROBLEM = re.compile(
+    r'^={70}\n(FAIL|ERROR): (\w+) \(([\w.]+)\)[^\n]*\n-{70}\n(.*?)(?=^={70}$|^-{70}\nRan )',
+    re.MULTILINE | re.DOTALL,
+)
+
+UNITTEST_STATUSES = {
+    'ok': TestCaseResult.PASSED,
+    'FAIL': TestCaseResult.FAILED,
+    'ERROR': TestCaseResult.ERROR,
+    'skipped': TestCaseResult.SKIPPED,
+    'expected failure': TestCaseResult.PASSED,
+    'unexpected success': TestCaseResult.FAILED,
+}
+
+
+def _truncate(output):
+    output = output.strip()
+    if len(output) > OUTPUT_LIMIT:
+        return output[:OUTPUT_LIMIT] + '\n…'
+    return output
+
+
+def _case(name, status, duration=None, output=''):
+    return {'name': name[:512], 'status': status, 'duration': duration, 'output': _truncate(output)}
+
+
+def _parse_plainrunner(stdout, stderr):
+    matches = PLAINRUNNER_SUMMARY.findall(stdout)
+    if not matches:
+        return []
+    try:
+        summary = json.loads(matches[-1])
+    except ValueError:
+        return []
+    valid = dict(TestCaseResult.STATUS_CHOICES)
+    return [
+        _case(
+            case['name'],
+            case['status'] if case['status'] in valid else TestCaseResult.ERROR,
+            case.get('duration'),
+        )
+        for case in summary.get('cases', [])
+    ]
+
+
+def _parse_junit(stdout, stderr):
+    match = JUNIT_XML.search(stdout)
+    if not match:
+        return []
+    try:
+        root = ElementTree.fromstring(match.group(0))
+    except ElementTree.ParseError:
+        return []
+    cases = []
+    for testcase in root.iter('testcase'):
+        name = '.'.join(filter(None, (testcase.get('classname'), testcase.get('name'))))
+        status, output = TestCaseResult.PASSED, ''
+        for tag, tag_status in (('failure', TestCaseResult.FAILED), ('error', TestCaseResult.ERROR),
+                                ('skipped', TestCaseResult.SKIPPED)):
+            element = testcase.find(tag)
+            if element is not None:
+                status = tag_status
+                output = '\n'.join(filter(None, (element.get('message'), element.text)))
+                break
+        try:
+            duration = float(testcase.get('time'))
+        except (TypeError, ValueError):
+            duration = None
+        cases.append(_case(name, status, duration, output))
+    return cases
+
+
+def _parse_gtest(stdout, stderr):
+    cases = []
+    runs = {match.group(1): match.end() for match in GTEST_RUN.finditer(stdout)}
+    for match in GTEST_RESULT.finditer(stdout):
+        result, name, milliseconds = match.groups()
+        output = stdout[runs[name]:match.start()] if name in runs else ''
+        status = TestCaseResult.PASSED if result == 'OK' else TestCaseResult.FAILED
+        cases.append(_case(name, status, int(milliseconds) / 1000, output))
+    return cases
+
+
+def _unittest_name(method, location):
+    return location if location.endswith('.' + method) else f'{location}.{method}'
+
+
+def _parse_unittest(stdout, stderr):
+    output = stderr + '\n' + stdout
+    problems = {
+        _unittest_name(method, location): (UNITTEST_STATUSES[kind], details)
+        for kind, method, location, details in UNITTEST_PROBLEM.findall(output)
+    }
+    cases = []
+    for method, location, result in UNITTEST_VERBOSE.findall(output):
+        name = _unittest_name(method, location)
+        details = problems.pop(name, (None, ''))[1]
+        cases.append(_case(name, UNITTEST_STATUSES[result], output=details))
+    # Without -v only failed and errored tests are named
+    for name, (status, details) in problems.items():
+        cases.append(_case(name, status, output=details))
+    return cases
+
+
+PARSERS = _parse_plainrunner, _parse_junit, _parse_gtest, _parse_unittest
+
+
+def parse(stdout, stderr):
+    for parser in PARSERS:
+        cases = parser(stdout, stderr)
+        if cases:
+            return cases
+    return []
+
+
+def save(solution, cases):
+    TestCaseResult.objects.filter(solution=solution).delete()
+    TestCaseResult.objects.bulk_create(
+        (TestCaseResult(solution=solution, task_id=solution.task_id, **case) for case in cases),
+        batch_size=500,
+    )
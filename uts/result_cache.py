@@ -0,0 +1,59 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from uts.models import CachedResult
+
+HIT_MESSAGE = 'Результат взят из кэша: такое же решение уже проверялось с теми же тестами и средой выполнения\n'
+
+
+def make_key(task, sandbox_id, solution_digest, tests_digest, limits):
+    if not settings.RESULT_CACHE_SIZE:
+        return None
+    environment = task.environment
+    parts = (
+        solution_digest,
+        tests_digest,
+        sandbox_id,
+        environment.command,
+        environment.solution_filename,
+        environment.tests_filename,
+        str(limits['cputime']),
+        str(limits['realtime']),
+        str(limits['memory']),
+    )
+    if environment.build_command:
+        parts += (environment.build_command, environment.build_artifact)
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def lookup(key):
+    if key is None:
+        return None
+    cached = CachedResult.objects.filter(key=key).first()
+    if cached is not None:
+        CachedResult.objects.filter(pk=cached.pk).update(used_at=timezone.now(), hits=F('hits') + 1)
+    return cached
+
+
+def store(key, task, state, log, log_file, test_results):
+    if key is None:
+        return
+    CachedResult.objects.update_or_create(
+        key=key,
+        defaults=dict(
+            task=task, state=state, log=log, log_file=log_file, test_results=test_results, used_at=timezone.now()
+        ),
+    )
+    evicted = CachedResult.objects.order_by('-used_at').values_list('pk', flat=True)[settings.RESULT_CACHE_SIZE:]
+    CachedResult.objects.filter(pk__in=list(evicted)).delete()
+
+
+def invalidate_task(task):
+    CachedResult.objects.filter(task=task).delete()
+
+
+def invalidate_environment(environment):
+    CachedResult.objects.filter(task__environment=environment).delete()
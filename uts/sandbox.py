@@ -0,0 +1,49 @@
+"""Sandbox backends an Environment can run its tests in.
+
+Every backend takes the same files and limits and returns the same report:
+exit_code, stdout, stderr (as captured), output_size (bytes of stdout and
+stderr before the capture), duration, timeout and oom_killed. The command is the
+test command of the environment unless another one, such as the build, is given.
+``cancelled`` is polled during the run, which is killed once it returns true;
+epicbox without the pool cannot be stopped and runs to the end.
+"""
+import epicbox
+from django.conf import settings
+
+from uts import inputs, local_sandbox, output, pool, profiles
+
+
+class DockerSandbox:
+    def identity(self, environment):
+        return profiles.get_profile(environment).image_id
+
+    def run(self, environment, files, limits, on_output=None, command=None, cancelled=None):
+        command = command or environment.command
+        if settings.SANDBOX_POOL_MAX_SIZE:
+            return pool.run(environment.docker_image, command, files, limits, on_output, cancelled)
+        profile = profiles.get_profile(environment)
+        # epicbox only takes the content of the files as bytes
+        files = [{'name': file['name'], 'content': inputs.read(file)} for file in files]
+        with epicbox.working_directory() as workdir:
+            report = epicbox.run(profile.name, command, files=files, limits=limits, workdir=workdir)
+        report['output_size'] = len(report['stdout']) + len(report['stderr'])
+        report['stdout'], report['stderr'] = output.capture(report['stdout']), output.capture(report['stderr'])
+        return report
+
+
+class LocalSandbox:
+    def identity(self, environment):
+        return 'local'
+
+    def run(self, environment, files, limits, on_output=None, command=None, cancelled=None):
+        return local_sandbox.run(command or environment.command, files, limits, on_output, cancelled)
+
+
+BACKENDS = {
+    'docker': DockerSandbox(),
+    'local': LocalSandbox(),
+}
+
+
+def get_sandbox(environment):
+    return BACKENDS[environment.sandbox_backend]
@@ -0,0 +1,171 @@
+"""Fair-share dispatching of sandbox runs.
+
+Runs are queued in Redis per cost class, priority and owner (a student or a
+regrade). Owners are served round-robin, each owner has a limit of runs in
+flight, and a cost class never has more runs in flight than its slots. Low
+priority runs are only dispatched when no normal run can be.
+"""
+import json
+import logging
+import time
+import uuid
+
+from django.conf import settings
+
+from uts.utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+NORMAL = 'normal'
+LOW = 'low'
+PRIORITIES = NORMAL, LOW
+
+KEY_PREFIX = 'uts:sched:'
+LOCK_KEY = KEY_PREFIX + 'lock'
+RUNNING_KEY = KEY_PREFIX + 'running'
+IN_FLIGHT_KEY = KEY_PREFIX + 'in-flight'
+
+
+def _key(cost_class, *parts):
+    return KEY_PREFIX + ':'.join((cost_class,) + parts)
+
+
+def cost_class(task):
+    if task.cpu_limit * task.memory_limit >= settings.SCHEDULER_HEAVY_COST:
+        return 'heavy'
+    return 'light'
+
+
+def queue_name(cost_class):
+    return f'sandbox-{cost_class}'
+
+
+def make_job(solution_id, task, owner, limit, priority=NORMAL, regrade_id=None):
+    return {
+        'id': str(uuid.uuid4()),
+        'solution': solution_id,
+        'regrade': regrade_id,
+        'class': cost_class(task),
+        'priority': priority,
+        'owner': owner,
+        'limit': limit,
+        'enqueued_at': time.time(),
+    }
+
+
+def submit(solution):
+    owner = f'user:{solution.author_id}'
+    enqueue([make_job(solution.pk, solution.task, owner, settings.SCHEDULER_STUDENT_IN_FLIGHT)])
+
+
+def enqueue(jobs):
+    client = get_redis(decode_responses=True)
+    with client.lock(LOCK_KEY, timeout=30, blocking_timeout=30):
+        pipe = client.pipeline(transaction=False)
+        for job in jobs:
+            cost_class, priority, owner = job['class'], job['priority'], job['owner']
+            pipe.rpush(_key(cost_class, priority, 'jobs', owner), json.dumps(job))
+            pipe.hincrby(_key(cost_class, 'pending'), priority, 1)
+        pipe.execute()
+        for cost_class, priority, owner in dict.fromkeys((job['class'], job['priority'], job['owner']) for job in jobs):
+            # The owners set keeps every owner on the ring at most once
+            if client.sadd(_key(cost_class, priority, 'owners'), owner):
+                client.rpush(_key(cost_class, priority, 'ring'), owner)
+    dispatch()
+
+
+def _next_job(client, cost_class):
+    for priority in PRIORITIES:
+        ring = _key(cost_class, priority, 'ring')
+        owners = _key(cost_class, priority, 'owners')
+        for _ in range(client.llen(ring)):
+            owner = client.lpop(ring)
+            if owner is None:
+                break
+            jobs = _key(cost_class, priority, 'jobs', owner)
+            head = client.lindex(jobs, 0)
+            if head is None:
+                client.srem(owners, owner)
+                continue
+            job = json.loads(head)
+            if int(client.hget(RUNNING_KEY, owner) or 0) >= job['limit']:
+                client.rpush(ring, owner)
+                continue
+            client.lpop(jobs)
+            if client.llen(jobs):
+                client.rpush(ring, owner)
+            else:
+                client.srem(owners, owner)
+            return job
+    return None
+
+
+def _reap(client):
+    deadline = time.time() - settings.SCHEDULER_JOB_TIMEOUT
+    for job_id, value in client.hgetall(IN_FLIGHT_KEY).items():
+        job = json.loads(value)
+        if job['started_at'] < deadline:
+            logger.warning('Sandbox run %s of solution %s was lost, releasing its slot', job_id, job['solution'])
+            _release(client, job)
+
+
+def _release(client, job):
+    if client.hdel(IN_FLIGHT_KEY, job['id']):
+        if client.hincrby(RUNNING_KEY, job['owner'], -1) <= 0:
+            client.hdel(RUNNING_KEY, job['owner'])
+        client.decr(_key(job['class'], 'running'))
+
+
+def dispatch():
+    client = get_redis(decode_responses=True)
+    ready = []
+    with client.lock(LOCK_KEY, timeout=30, blocking_timeout=30):
+        _reap(client)
+        for cost_class, slots in settings.SCHEDULER_SLOTS.items():
+            while int(client.get(_key(cost_class, 'running')) or 0) < slots:
+                job = _next_job(client, cost_class)
+                if job is None:
+                    break
+                job['started_at'] = time.time()
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(IN_FLIGHT_KEY, job['id'], json.dumps(job))
+                pipe.hincrby(RUNNING_KEY, job['owner'], 1)
+                pipe.incr(_key(cost_class, 'running'))
+                pipe.hincrby(_key(cost_class, 'pending'), job['priority'], -1)
+                pipe.hincrby(_key(cost_class, 'stats'), 'dispatched', 1)
+                pipe.hincrbyfloat(_key(cost_class, 'stats'), 'wait_seconds', job['started_at'] - job['enqueued_at'])
+                pipe.execute()
+                ready.append(job)
+
+    from uts.tasks import run_scheduled_job
+    # Sent outside of the lock: eager Celery runs the job (and its finish()) right here
+    for job in ready:
+        run_scheduled_job.apply_async((job,), queue=queue_name(job['class']))
+
+
+def finish(job):
+    client = get_redis(decode_responses=True)
+    with client.lock(LOCK_KEY, timeout=30, blocking_timeout=30):
+        _release(client, job)
+    dispatch()
+
+
+def stats():
+    client = get_redis(decode_responses=True)
+    result = []
+    for cost_class, slots in settings.SCHEDULER_SLOTS.items():
+        pending = client.hgetall(_key(cost_class, 'pending'))
+        counters = client.hgetall(_key(cost_class, 'stats'))
+        dispatched = int(counters.get('dispatched', 0))
+        wait = float(counters.get('wait_seconds', 0))
+        result.append({
+            'class': cost_class,
+            'queue': queue_name(cost_class),
+            'slots': slots,
+            'running': int(client.get(_key(cost_class, 'running')) or 0),
+            'pending': int(pending.get(NORMAL, 0)),
+            'pending_low': int(pending.get(LOW, 0)),
+            'dispatched': dispatched,
+            'average_wait': wait / dispatched if dispatched else 0.0,
+        })
+    return result
@@ -1,15 +1,166 @@
-from django.db.models.signals import post_save
+import logging
+import threading
+
+from celery.signals import worker_process_init, worker_process_shutdown, worker_ready
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save
 from django.dispatch import receiver
-from django.db import transaction
+from django.db import connection, transaction
+from epicbox.exceptions import DockerError
+
+from uts import live, metrics, page_cache, pool, profiles, result_cache, statuses, storage, supersede, utils
+from uts.models import BuildArtifact, CachedResult, Environment, Solution, Task
+from uts.tasks import submit_solution
 
-from uts.models import Solution
-from uts.tasks import run_solution
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=Solution)
 def _run_sandbox_callback(sender, instance: Solution, **__):
     if instance.state == Solution.NEW:
-        transaction.on_commit(lambda: run_solution.delay(instance.pk))
+        transaction.on_commit(
+            lambda: submit_solution.apply_async((instance.pk,), countdown=settings.UPLOAD_DEBOUNCE)
+        )
+
+
+@receiver(post_delete, sender=Solution)
+def _cancel_solution_run(sender, instance: Solution, **__):
+    if instance.state in (Solution.NEW, Solution.RUNNING):
+        supersede.cancel(instance.pk)
+
+
+@receiver(post_save, sender=Solution)
+def _publish_solution_state(sender, instance: Solution, **__):
+    transaction.on_commit(lambda: live.publish_state(instance))
+
+
+@receiver(post_save, sender=Solution)
+@receiver(post_delete, sender=Solution)
+def _refresh_task_status(sender, instance: Solution, **__):
+    statuses.refresh(instance.author_id, instance.task_id)
+
+
+BLOB_FIELDS = {
+    Solution: ('solution_file', 'log_file'),
+    Task: ('tests_file',),
+    BuildArtifact: ('artifact_file',),
+    CachedResult: ('log_file',),
+}
+
+
+def _loaded_file_name(instance, field):
+    # A deferred field is not loaded just to remember its name
+    value = instance.__dict__.get(field)
+    return getattr(value, 'name', value)
+
+
+@receiver(post_init, sender=Solution)
+@receiver(post_init, sender=Task)
+@receiver(post_init, sender=BuildArtifact)
+@receiver(post_init, sender=CachedResult)
+def _remember_blob(sender, instance, **__):
+    if instance.pk is not None:
+        instance._blob_names = {
+            field: _loaded_file_name(instance, field) for field in BLOB_FIELDS[sender] if field in instance.__dict__
+        }
+
+
+@receiver(post_save, sender=Solution)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=BuildArtifact)
+@receiver(post_save, sender=CachedResult)
+def _count_blob_references(sender, instance, created, **__):
+    remembered = getattr(instance, '_blob_names', {})
+    names = {field: _loaded_file_name(instance, field) for field in BLOB_FIELDS[sender]}
+    for field, name in names.items():
+        if created:
+            storage.add_references([name])
+        elif field in remembered and remembered[field] != name:
+            storage.add_references([name])
+            storage.remove_references([remembered[field]])
+    instance._blob_names = names
+
+
+@receiver(post_delete, sender=Solution)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=BuildArtifact)
+@receiver(post_delete, sender=CachedResult)
+def _release_blob(sender, instance, **__):
+    storage.remove_references([_loaded_file_name(instance, field) for field in BLOB_FIELDS[sender]])
+
+
+@receiver(post_save, sender=Task)
+def _invalidate_task_results(sender, instance: Task, **__):
+    result_cache.invalidate_task(instance)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def _invalidate_task_pages(sender, instance: Task, **__):
+    page_cache.invalidate(task_id=instance.pk)
+
+
+@receiver(post_save, sender=Environment)
+@receiver(post_delete, sender=Environment)
+def _invalidate_environment_pages(sender, instance: Environment, **__):
+    page_cache.invalidate(everything=True)
+
+
+@receiver(post_save, sender=Solution)
+@receiver(post_delete, sender=Solution)
+def _invalidate_student_pages(sender, instance: Solution, **__):
+    page_cache.invalidate(user_id=instance.author_id)
+
+
+@receiver(post_save, sender=Environment)
+def _invalidate_environment_results(sender, instance: Environment, **__):
+    result_cache.invalidate_environment(instance)
+    profiles.invalidate(instance.pk)
+
+
+@receiver(post_migrate)
+def _setup_student_group(sender, **__):
+    if sender.name == 'uts':
+        utils.setup_student_group()
+        utils.reset_student_group_cache()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def _reset_student_group_cache(sender, instance: Group, **__):
+    if instance.name == utils.STUDENT_GROUP_NAME:
+        utils.reset_student_group_cache()
+
+
+def _warm_up_sandboxes():
+    try:
+        environments = list(Environment.objects.filter(sandbox_backend=Environment.DOCKER))
+    finally:
+        connection.close()
+    for environment in environments:
+        try:
+            profiles.get_profile(environment)
+        except DockerError:
+            logger.warning('Image of environment "%s" is not available', environment, exc_info=True)
+    if settings.SANDBOX_POOL_MAX_SIZE:
+        pool.warm_up({environment.docker_image for environment in environments})
+
+
+@worker_process_init.connect
+def _start_sandbox_pools(**__):
+    threading.Thread(target=_warm_up_sandboxes, daemon=True).start()
+
+
+@worker_process_shutdown.connect
+def _stop_sandbox_pools(**__):
+    pool.shutdown()
+
+
+@worker_ready.connect
+def _serve_worker_metrics(**__):
+    if settings.WORKER_METRICS_PORT:
+        metrics.serve(settings.WORKER_METRICS_PORT)
 
 
 ready = False
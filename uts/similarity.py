@@ -0,0 +1,169 @@
+"""Similar solutions of a task, for plagiarism checks.
+
+A solution is split into tokens with names, numbers and strings replaced by
+placeholders, so renaming variables does not hide a copy. Hashes of every
+``KGRAM`` consecutive tokens are winnowed: the smallest hash of every window of
+``WINDOW`` k-grams is kept. The similarity of two solutions is the Jaccard
+index of their winnowed hashes.
+
+Comparing a new solution with every other one of the task would be linear in
+the size of the task, so the hashes are summarised by a MinHash signature of
+``BANDS * ROWS`` values, stored as ``BANDS`` band hashes. Only solutions that
+share a band with the new one are compared exactly; with 16 bands of 4 rows a
+pair with a similarity of 0.5 shares a band with a probability of about 2/3,
+and a pair with 0.8 of almost 1.
+"""
+import hashlib
+import keyword
+import random
+import re
+import struct
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from uts import inputs
+from uts.models import SimilarityBand, SimilarityMatch, SolutionFingerprint
+
+KGRAM = 5
+WINDOW = 4
+BANDS = 16
+ROWS = 4
+
+HASH_MASK = (1 << 63) - 1
+MERSENNE_PRIME = (1 << 61) - 1
+_random = random.Random(0)
+PERMUTATIONS = [
+    (_random.randrange(1, MERSENNE_PRIME), _random.randrange(MERSENNE_PRIME))
+    for _ in range(BANDS * ROWS)
+]
+
+TOKEN_RE = re.compile(r'''
+    (?P<comment>\#[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<string>"{3}.*?"{3}|'{3}.*?'{3}|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<number>\d[\w.]*)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<operator>\S)
+''', re.S | re.X)
+KEYWORDS = set(keyword.kwlist) | {
+    'auto', 'bool', 'case', 'catch', 'char', 'const', 'default', 'do', 'double', 'extends', 'float', 'func',
+    'function', 'implements', 'int', 'interface', 'let', 'long', 'new', 'package', 'private', 'protected',
+    'public', 'static', 'struct', 'switch', 'this', 'throw', 'throws', 'typedef', 'unsigned', 'var', 'void',
+}
+
+
+def tokenize(text):
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+        if kind == 'name':
+            yield match.group() if match.group() in KEYWORDS else 'N'
+        elif kind == 'operator':
+            yield match.group()
+        else:
+            yield kind[0].upper()
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big') & HASH_MASK
+
+
+def fingerprint(text):
+    """Winnowed k-gram hashes of a source text, sorted."""
+    tokens = list(tokenize(text))
+    grams = [_hash(' '.join(tokens[i:i + KGRAM])) for i in range(len(tokens) - KGRAM + 1)]
+    if len(grams) <= WINDOW:
+        return sorted(set(grams))
+    return sorted({min(grams[i:i + WINDOW]) for i in range(len(grams) - WINDOW + 1)})
+
+
+def bands(hashes):
+    if not hashes:
+        return []
+    signature = [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in PERMUTATIONS]
+    return [
+        _hash(' '.join(map(str, signature[band * ROWS:(band + 1) * ROWS])))
+        for band in range(BANDS)
+    ]
+
+
+def pack(hashes):
+    return struct.pack(f'<{len(hashes)}q', *hashes)
+
+
+def unpack(data):
+    data = bytes(data)
+    return struct.unpack(f'<{len(data) // 8}q', data)
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def index_solution(solution):
+    """Fingerprints a solution and records its similar solutions of other students.
+
+    Does nothing for a solution that is already indexed. Returns the number of
+    similar solutions found.
+    """
+    if SolutionFingerprint.objects.filter(solution=solution).exists():
+        return 0
+    content = inputs.read({'file': solution.solution_file})
+    hashes = fingerprint(content.decode('utf8', 'replace'))
+    values = bands(hashes)
+    # The bands are committed before the lookup: of two solutions indexed at the same time, at least one finds the other
+    with transaction.atomic():
+        SolutionFingerprint.objects.create(solution=solution, task_id=solution.task_id, hashes=pack(hashes))
+        SimilarityBand.objects.bulk_create([
+            SimilarityBand(task_id=solution.task_id, solution=solution, band=band, value=value)
+            for band, value in enumerate(values)
+        ])
+    if not values:
+        return 0
+
+    lookup = Q()
+    for band, value in enumerate(values):
+        lookup |= Q(band=band, value=value)
+    candidates = (
+        SimilarityBand.objects
+        .filter(lookup, task_id=solution.task_id)
+        .exclude(solution__author_id=solution.author_id)
+        .values('solution_id')
+    )
+    own = set(hashes)
+    matches = []
+    others = SolutionFingerprint.objects.filter(solution_id__in=candidates).values_list('solution_id', 'hashes')
+    for other_id, other_hashes in others:
+        similarity = jaccard(own, set(unpack(other_hashes)))
+        if similarity >= settings.SIMILARITY_THRESHOLD:
+            matches.append(SimilarityMatch(
+                task_id=solution.task_id,
+                solution_id=max(solution.pk, other_id),
+                other_id=min(solution.pk, other_id),
+                similarity=similarity,
+            ))
+    SimilarityMatch.objects.bulk_create(matches, ignore_conflicts=True)
+    return len(matches)
+
+
+def similar_to(solution):
+    return (
+        SimilarityMatch.objects
+        .filter(Q(solution=solution) | Q(other=solution))
+        .select_related('solution__author', 'other__author')
+        .order_by('-similarity')
+    )
+
+
+def report(task, limit=None):
+    matches = (
+        SimilarityMatch.objects
+        .filter(task=task)
+        .select_related('solution__author', 'other__author')
+        .order_by('-similarity')
+    )
+    return matches[:limit or settings.SIMILARITY_REPORT_LIMIT]
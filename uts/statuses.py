@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models import Count, Q
+
+from uts.models import Solution, TaskStatus
+
+SOLUTION_COUNTS = dict(
+    total=Count('pk'),
+    solved=Count('pk', filter=Q(state=Solution.COMPLETED)),
+    checked=Count('pk', filter=Q(checked=True)),
+)
+
+
+def refresh(user_id, task_id):
+    counts = Solution.objects.filter(author_id=user_id, task_id=task_id).aggregate(**SOLUTION_COUNTS)
+    if not counts['total']:
+        TaskStatus.objects.filter(user_id=user_id, task_id=task_id).delete()
+        return
+    TaskStatus.objects.update_or_create(
+        user_id=user_id, task_id=task_id,
+        defaults=dict(solved=bool(counts['solved']), checked=bool(counts['checked'])),
+    )
+
+
+def rebuild(tasks=None, batch_size=1000):
+    solutions = Solution.objects.all()
+    statuses = TaskStatus.objects.all()
+    if tasks is not None:
+        solutions = solutions.filter(task__in=tasks)
+        statuses = statuses.filter(task__in=tasks)
+    rows = solutions.values('author_id', 'task_id').annotate(**SOLUTION_COUNTS).order_by().iterator()
+    with transaction.atomic():
+        statuses.delete()
+        batch = []
+        for row in rows:
+            batch.append(TaskStatus(
+                user_id=row['author_id'], task_id=row['task_id'],
+                solved=bool(row['solved']), checked=bool(row['checked']),
+            ))
+            if len(batch) >= batch_size:
+                TaskStatus.objects.bulk_create(batch)
+                batch = []
+        TaskStatus.objects.bulk_create(batch)
@@ -0,0 +1,144 @@
+"""Content-addressed storage of uploaded solutions and tests, build artifacts and full logs.
+
+A file is stored once under the SHA-256 of its content, in sharded
+directories: ``blobs/ab/cd/abcd…``. Uploading the same bytes again reuses the
+blob, so the name of a file is also its hash and nobody has to read the file to
+know it. Blobs are never deleted when a row is: ``Blob.references`` counts the
+rows pointing to a blob and ``collect_garbage`` removes the ones nobody uses.
+"""
+import hashlib
+import os
+import re
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+BLOB_NAME = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})$')
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_name(digest):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+def digest(name):
+    """SHA-256 of a stored file taken from its name, None for files stored before blobs."""
+    match = BLOB_NAME.match(name or '')
+    return match.group(1) if match else None
+
+
+def file_digest(file, content=None):
+    """SHA-256 of a stored file, hashing the content only for files stored before blobs."""
+    name_digest = digest(file.name)
+    if name_digest:
+        return name_digest
+    if content is not None:
+        return hashlib.sha256(content).hexdigest()
+    sha256 = hashlib.sha256()
+    for chunk in file.open('rb').chunks(CHUNK_SIZE):
+        sha256.update(chunk)
+    file.close()
+    return sha256.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The real name is only known once the content is hashed in _save
+        return name
+
+    def _save(self, name, content):
+        from uts.models import Blob
+
+        os.makedirs(self.path(BLOB_DIR), exist_ok=True)
+        temp_path = self.path(f'{BLOB_DIR}/.upload-{uuid.uuid4().hex}')
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as temp:
+                for chunk in File(content).chunks(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+            name = blob_name(sha256.hexdigest())
+            # Touching the row first keeps collect_garbage away from the blob until the upload is referenced
+            Blob.objects.update_or_create(
+                digest=sha256.hexdigest(), defaults=dict(size=size, updated_at=timezone.now()),
+            )
+            if self.exists(name):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+                file_move_safe(temp_path, self.path(name), allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(self.path(name), self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        # Other rows may share the blob, it is removed by collect_garbage once unreferenced
+        if digest(name) is None:
+            super().delete(name)
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def add_references(names, count=1):
+    from uts.models import Blob
+    digests = [digest(name) for name in names if digest(name)]
+    for value in set(digests):
+        Blob.objects.filter(digest=value).update(
+            references=F('references') + count * digests.count(value),
+            updated_at=timezone.now(),
+        )
+
+
+def remove_references(names):
+    add_references(names, count=-1)
+
+
+def collect_garbage(grace=timedelta(hours=1), dry_run=False):
+    """Removes unreferenced blobs and leftovers of interrupted uploads.
+
+    Blobs changed within ``grace`` are kept: an upload saves the file before
+    its row is committed and referenced. Returns (removed blobs, freed bytes).
+    """
+    from uts.models import Blob
+
+    deadline = timezone.now() - grace
+    removed = freed = 0
+    orphans = Blob.objects.filter(references__lte=0, updated_at__lt=deadline)
+    for pk in orphans.values_list('pk', flat=True).iterator():
+        # The row stays locked until the file is gone: an upload of the same content waits, then recreates both
+        with transaction.atomic():
+            blob = orphans.select_for_update().filter(pk=pk).first()
+            if blob is None:
+                continue
+            removed += 1
+            freed += blob.size
+            if not dry_run:
+                FileSystemStorage.delete(blob_storage, blob_name(blob.digest))
+                blob.delete()
+
+    root = blob_storage.path(BLOB_DIR)
+    if os.path.isdir(root):
+        for entry in os.scandir(root):
+            if entry.name.startswith('.upload-') and entry.stat().st_mtime < time.time() - grace.total_seconds():
+                removed += 1
+                freed += entry.stat().st_size
+                if not dry_run:
+                    os.remove(entry.path)
+    return removed, freed
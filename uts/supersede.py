@@ -0,0 +1,57 @@
+"""Cancellation of runs of solutions that were deleted, e.g. replaced by a new upload.
+
+Deleting a new or running solution leaves a flag in Redis. A job queued for it
+finds no row and returns at once; a run in progress polls the flag through a
+``Cancellation`` and the backend kills the sandbox, and the worker never saves
+the results of a solution that no longer exists.
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from uts.utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'uts:cancelled:'
+# Seconds between checks of a running sandbox
+CHECK_INTERVAL = 1
+
+
+def _set(solution_id):
+    try:
+        get_redis().set(KEY_PREFIX + str(solution_id), 1, ex=settings.SCHEDULER_JOB_TIMEOUT)
+    except redis.RedisError:
+        logger.warning('Failed to cancel the run of solution %s', solution_id, exc_info=True)
+
+
+def cancel(solution_id):
+    """Cancels the run of a deleted solution once the transaction commits."""
+    transaction.on_commit(lambda: _set(solution_id))
+
+
+class Cancellation:
+    """Callable telling whether the run of a solution was cancelled.
+
+    Sandbox backends call it while the run goes on, Redis is asked at most once
+    in ``CHECK_INTERVAL`` seconds unless ``force`` is given.
+    """
+
+    def __init__(self, solution_id):
+        self.solution_id = solution_id
+        self.cancelled = False
+        self.checked_at = None
+
+    def __call__(self, force=False):
+        now = time.monotonic()
+        if self.cancelled or not force and self.checked_at is not None and now - self.checked_at < CHECK_INTERVAL:
+            return self.cancelled
+        self.checked_at = now
+        try:
+            self.cancelled = bool(get_redis().exists(KEY_PREFIX + str(self.solution_id)))
+        except redis.RedisError:
+            logger.warning('Failed to check the run of solution %s', self.solution_id, exc_info=True)
+        return self.cancelled
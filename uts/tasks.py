@@ -1,21 +1,54 @@
+import logging
+import time
 import traceback
 
-import epicbox
 from celery import shared_task
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
 
-from uts.models import Solution
+from uts import (
+    admission, builds, inputs, live, metrics, output, reports, result_cache, scheduler, similarity, storage, supersede,
+)
+from uts.models import Regrade, Solution
+from uts.sandbox import get_sandbox
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task()
-def run_solution(solution_id: int):
-    solution = Solution.objects.get(pk=solution_id)
+def run_solution(solution_id: int, enqueued_at: float = None):
+    solution = Solution.objects.select_related('task__environment').filter(pk=solution_id).first()
+    if solution is None:
+        # Deleted while queued, usually replaced by a new upload
+        logger.info('Solution %s no longer exists, skipping its run', solution_id)
+        return
     solution.state = Solution.RUNNING
-    solution.save()
+    try:
+        # A plain save would insert the row again if it was deleted just now
+        solution.save(force_update=True)
+    except DatabaseError:
+        logger.info('Solution %s no longer exists, skipping its run', solution_id)
+        return
+    stats = metrics.Batch(solution.task.environment, solution.task)
+    if enqueued_at is not None:
+        stats.observe('uts_queue_wait_seconds', max(0.0, time.time() - enqueued_at))
+    try:
+        _run_solution(solution, stats)
+    finally:
+        stats.flush()
+    index_similarity.delay(solution.pk)
+
 
+def _run_solution(solution, stats):
+    cancelled = supersede.Cancellation(solution.pk)
     try:
+        # The solution is streamed into the sandbox by the backend, tests come from the worker cache
+        tests_content = inputs.read_cached(solution.task.tests_file)
         files = [
-            {'name': solution.task.environment.solution_filename, 'content': solution.solution_file.read()},
-            {'name': solution.task.environment.tests_filename, 'content': solution.task.tests_file.read()},
+            {'name': solution.task.environment.solution_filename, 'file': solution.solution_file},
+            {'name': solution.task.environment.tests_filename, 'content': tests_content},
         ]
         limits = {
             'cputime': solution.task.cpu_limit,
@@ -23,46 +56,209 @@ def run_solution(solution_id: int):
             'memory': solution.task.memory_limit,
             'processes': 15,
         }
-        epicbox.configure(
-            profiles=[
-                epicbox.Profile('main', solution.task.environment.docker_image, read_only=False, network_disabled=True)
-            ]
+        sandbox = get_sandbox(solution.task.environment)
+        identity = sandbox.identity(solution.task.environment)
+        cache_key = result_cache.make_key(
+            solution.task,
+            identity,
+            storage.file_digest(solution.solution_file),
+            storage.file_digest(solution.task.tests_file, tests_content),
+            limits,
         )
+        cached = result_cache.lookup(cache_key)
+        if cached is not None:
+            solution.log = result_cache.HIT_MESSAGE + cached.log
+            solution.log_file = cached.log_file.name
+            solution.state = cached.state
+            if not _save(solution, stats):
+                return
+            reports.save(solution, cached.test_results)
+            stats.inc('uts_runs_total', result='cached')
+            return
     except Exception as e:
         solution.log = 'Произошла ошибка при конфигурации среды выполнения:\n' + traceback.format_exc() + '\n' + str(e)
         solution.state = Solution.FAILED
-        solution.save()
+        if not _save(solution, stats):
+            return
+        stats.inc('uts_runs_total', result='error')
         return
+    build_summary = ''
+    if solution.task.environment.build_command:
+        try:
+            build, build_cached = builds.get_or_build(sandbox, solution.task.environment, solution, cancelled)
+        except Exception as e:
+            if _superseded(solution, cancelled, stats):
+                return
+            solution.log = 'Произошла ошибка среды выполнения при сборке:\n' + traceback.format_exc() + '\n' + str(e)
+            solution.state = Solution.FAILED
+            if not _save(solution, stats):
+                return
+            stats.inc('uts_runs_total', result='error')
+            return
+        if _superseded(solution, cancelled, stats):
+            return
+        if not build_cached:
+            stats.observe('uts_build_duration_seconds', build.duration)
+        build_summary = _format_build(build, build_cached)
+        if not build.success:
+            solution.log = f'{build_summary}\nСборка не удалась\n\n{build.log}'
+            solution.log_file = None
+            solution.state = Solution.FAILED
+            if not _save(solution, stats):
+                return
+            reports.save(solution, [])
+            stats.inc('uts_runs_total', result='build_failed')
+            return
+        files.append(builds.artifact_input(solution.task.environment, build))
     try:
-        with epicbox.working_directory() as workdir:
-            raw_report = epicbox.run(
-                'main',
-                solution.task.environment.command,
+        with admission.reserve(limits) as waited:
+            stats.observe('uts_admission_wait_seconds', waited)
+            if _superseded(solution, cancelled, stats):
+                return
+            sandbox_started_at = time.monotonic()
+            raw_report = sandbox.run(
+                solution.task.environment,
                 files=files,
                 limits=limits,
-                workdir=workdir
+                on_output=live.OutputPublisher(solution.pk),
+                cancelled=cancelled,
             )
     except Exception as e:
+        if _superseded(solution, cancelled, stats):
+            return
         solution.log = 'Произошла ошибка среды выполнения при выполнении:\n' + traceback.format_exc() + '\n' + str(e)
         solution.state = Solution.FAILED
-        solution.save()
+        if not _save(solution, stats):
+            return
+        stats.inc('uts_runs_total', result='error')
         return
+    sandbox_finished_at = time.monotonic()
+    if _superseded(solution, cancelled, stats):
+        return
+    stats.observe('uts_sandbox_setup_seconds', max(0.0, sandbox_finished_at - sandbox_started_at - raw_report['duration']))
+    stats.observe('uts_run_duration_seconds', raw_report['duration'])
+    # Captured output is cut at SANDBOX_OUTPUT_CAPTURE_LIMIT, the metric counts what the run printed
+    stats.observe('uts_output_bytes', raw_report['output_size'])
+
+    # Backends keep the head and the tail of the output, the summary of the tests is at the end
+    stdout = raw_report['stdout'].decode('utf8', errors='replace')
+    stderr = raw_report['stderr'].decode('utf8', errors='replace')
+    short_stdout, stdout_truncated = output.head_tail(stdout)
+    short_stderr, stderr_truncated = output.head_tail(stderr)
+    solution.log = _format_log(raw_report, short_stdout, short_stderr, build_summary)
+    if stdout_truncated or stderr_truncated:
+        solution.log_file = output.compress(
+            f'solution-{solution.pk}', _format_log(raw_report, stdout, stderr, build_summary),
+        )
+    else:
+        solution.log_file = None
+
+    if any((raw_report['exit_code'], raw_report['timeout'], raw_report['oom_killed'])):
+        solution.state = Solution.FAILED
+    else:
+        solution.state = Solution.COMPLETED
+    if not _save(solution, stats):
+        return
+    test_results = reports.parse(stdout, stderr)
+    reports.save(solution, test_results)
+
+    # Timeouts depend on the load of the host at the moment, so they are always re-run
+    if not raw_report['timeout']:
+        result_cache.store(cache_key, solution.task, solution.state, solution.log, solution.log_file.name, test_results)
+
+    stats.observe('uts_db_save_seconds', time.monotonic() - sandbox_finished_at)
+    if raw_report['timeout']:
+        stats.inc('uts_runs_total', result='timeout')
+    elif raw_report['oom_killed']:
+        stats.inc('uts_runs_total', result='oom')
+    else:
+        stats.inc('uts_runs_total', result='ok' if solution.state == Solution.COMPLETED else 'failed')
+
+
+def _save(solution, stats):
+    """Saves the results of a run, unless the solution was deleted while it ran."""
+    try:
+        # A plain save would insert the deleted row again
+        solution.save(force_update=True)
+    except DatabaseError:
+        logger.info('Solution %s was deleted during its run, its results are discarded', solution.pk)
+        stats.inc('uts_runs_total', result='superseded')
+        return False
+    return True
+
 
-    solution.log = f'''
+def _superseded(solution, cancelled, stats):
+    if not cancelled(force=True):
+        return False
+    logger.info('Run of solution %s was cancelled, its results are discarded', solution.pk)
+    stats.inc('uts_runs_total', result='superseded')
+    return True
+
+
+def _format_build(build, cached):
+    summary = f'Сборка заняла {build.duration:.2f} секунд'
+    return summary + (' (результат сборки взят из кэша)' if cached else '')
+
+
+def _format_log(raw_report, stdout, stderr, build_summary=''):
+    return f'''{build_summary}
 Тесты завершены, код ошибки: {raw_report['exit_code']}
 Выполнение заняло {raw_report['duration']:.2f} секунд
 {'Выполнение прервано по таймауту' if raw_report['timeout'] else ''}
 {'Выполнение прервано по превышению лимита ОЗУ' if raw_report['oom_killed'] else ''}
 
 Стандартный вывод:
-{raw_report['stdout'].decode('utf8')}
+{stdout}
 
 stderr:
-{raw_report['stderr'].decode('utf8')}
+{stderr}
 '''
 
-    if any((raw_report['exit_code'], raw_report['timeout'], raw_report['oom_killed'])):
-        solution.state = Solution.FAILED
+
+@shared_task()
+def submit_solution(solution_id: int):
+    # Sent with a countdown: a solution replaced by a new upload in the meantime is gone and never runs
+    solution = Solution.objects.select_related('task').filter(pk=solution_id, state=Solution.NEW).first()
+    if solution is None:
+        return
+    if settings.SCHEDULER_ENABLED:
+        scheduler.submit(solution)
     else:
-        solution.state = Solution.COMPLETED
-    solution.save()
+        run_solution.delay(solution.pk, time.time())
+
+
+@shared_task()
+def index_similarity(solution_id: int):
+    solution = Solution.objects.filter(pk=solution_id).first()
+    if solution is not None:
+        similarity.index_solution(solution)
+
+
+@shared_task()
+def regrade_solution(regrade_id: int, solution_id: int, enqueued_at: float = None):
+    # Never raise: an exception would break the chain and stall the rest of the lane
+    try:
+        run_solution(solution_id, enqueued_at)
+        failed = Solution.objects.filter(pk=solution_id, state=Solution.FAILED).exists()
+    except Solution.DoesNotExist:
+        failed = False
+    except Exception:
+        logger.exception('Failed to regrade solution %s', solution_id)
+        failed = True
+
+    counter = 'failed' if failed else 'done'
+    Regrade.objects.filter(pk=regrade_id).update(**{counter: F(counter) + 1})
+    Regrade.objects.filter(
+        pk=regrade_id, finished_at=None, total__lte=F('done') + F('failed')
+    ).update(finished_at=timezone.now())
+
+
+@shared_task()
+def run_scheduled_job(job: dict):
+    try:
+        if job['regrade'] is not None:
+            regrade_solution(job['regrade'], job['solution'], job['enqueued_at'])
+        else:
+            run_solution(job['solution'], job['enqueued_at'])
+    finally:
+        scheduler.finish(job)
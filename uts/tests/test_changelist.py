@@ -0,0 +1,72 @@
+from datetime import datetime
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.test import RequestFactory, TestCase, override_settings
+
+from uts.admin import admin_site
+from uts.changelist import CURSOR_VAR, EstimatedCountPaginator
+from uts.models import Environment, Solution, Task, User
+
+
+class KeysetChangeListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+        task = Task.objects.create(
+            name='Task', description='', environment=Environment.objects.get(name='Pure Python'),
+            tests_file='tests.py',
+        )
+        # Two pairs share created_at, the pk breaks the tie
+        times = [datetime(2021, 1, day) for day in (1, 2, 2, 3, 3)]
+        cls.solutions = [
+            Solution.objects.create(author=cls.admin, task=task, solution_file='main.py', created_at=created_at)
+            for created_at in times
+        ]
+        cls.expected = sorted(cls.solutions, key=lambda solution: (solution.created_at, solution.pk), reverse=True)
+
+    def changelist(self, params=None):
+        request = RequestFactory().get('/uts/solution/', params or {})
+        request.user = self.admin
+        model_admin = admin_site._registry[Solution]
+        with mock.patch.object(model_admin, 'list_per_page', 2):
+            return model_admin.get_changelist_instance(request)
+
+    def test_pages_follow_the_cursor(self):
+        pages = []
+        params = {}
+        while True:
+            changelist = self.changelist(params)
+            self.assertTrue(changelist.keyset)
+            pages.append(list(changelist.result_list))
+            if changelist.next_page_url is None:
+                break
+            params = {name: values[0] for name, values in parse_qs(urlparse(changelist.next_page_url).query).items()}
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([solution for page in pages for solution in page], self.expected)
+
+    def test_filters_drop_the_cursor(self):
+        changelist = self.changelist({CURSOR_VAR: '2021-01-02T00:00:00_1'})
+        self.assertNotIn(CURSOR_VAR, changelist.get_query_string({'state': Solution.NEW}))
+
+    def test_bad_cursor_is_rejected(self):
+        with self.assertRaises(IncorrectLookupParameters):
+            self.changelist({CURSOR_VAR: 'yesterday'})
+
+    def test_sorting_falls_back_to_numbered_pages(self):
+        changelist = self.changelist({'o': '4'})
+        self.assertFalse(changelist.keyset)
+        self.assertEqual(changelist.result_count, 5)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def test_count_stops_at_the_limit(self):
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(5)])
+        with override_settings(ADMIN_COUNT_LIMIT=3):
+            paginator = EstimatedCountPaginator(User.objects.order_by('pk'), 2)
+            self.assertEqual(paginator.count, 3)
+            self.assertTrue(paginator.truncated)
+        paginator = EstimatedCountPaginator(User.objects.order_by('pk'), 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.truncated)
@@ -0,0 +1,79 @@
+import csv
+import io
+from datetime import datetime
+
+from django.test import TestCase
+
+from uts import gradebook
+from uts.models import Environment, Solution, Task, TestCaseResult, User
+
+
+class GradebookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        environment = Environment.objects.get(name='Pure Python')
+        cls.first, cls.second = [
+            Task.objects.create(name=name, description='', environment=environment, tests_file='tests.py')
+            for name in ('Первая', 'Вторая')
+        ]
+        cls.ivanov = User.objects.create(username='ivanov', last_name='Иванов', first_name='Иван', is_student=True)
+        cls.petrov = User.objects.create(username='petrov', last_name='Петров', first_name='Пётр', is_student=True)
+        cls.sidorov = User.objects.create(username='sidorov', is_student=True)
+        cls.teacher = User.objects.create_user('teacher', password='teacher', is_staff=True, is_superuser=True)
+
+        solved = cls.solve(cls.ivanov, cls.first, Solution.COMPLETED, checked=True)
+        for status, duration in (
+            (TestCaseResult.PASSED, 0.5), (TestCaseResult.PASSED, 0.25),
+            (TestCaseResult.FAILED, 1.0), (TestCaseResult.SKIPPED, None),
+        ):
+            TestCaseResult.objects.create(
+                solution=solved, task=cls.first, name=f'test {status}', status=status, duration=duration,
+            )
+        cls.solve(cls.ivanov, cls.second, Solution.FAILED)
+        cls.solve(cls.petrov, cls.first, Solution.COMPLETED)
+
+    @classmethod
+    def solve(cls, author, task, state, checked=False):
+        return Solution.objects.create(
+            author=author, task=task, solution_file='main.py', state=state, checked=checked,
+            created_at=datetime(2021, 5, 1, 12, 30),
+        )
+
+    def read(self, lines):
+        text = ''.join(lines)
+        self.assertTrue(text.startswith(gradebook.BOM))
+        return list(csv.reader(io.StringIO(text[len(gradebook.BOM):])))
+
+    def test_solution_rows_aggregate_test_results_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = list(gradebook.solution_rows())
+        self.assertEqual(rows, [
+            ('ivanov', 'Иванов', 'Иван', 'Вторая', 'Провалено', 'нет', '2021-05-01 12:30:00', '', 0, 0),
+            ('ivanov', 'Иванов', 'Иван', 'Первая', 'Завершено успешно', 'да', '2021-05-01 12:30:00', '1.750', 2, 1),
+            ('petrov', 'Петров', 'Пётр', 'Первая', 'Завершено успешно', 'нет', '2021-05-01 12:30:00', '', 0, 0),
+        ])
+
+    def test_solution_rows_of_selected_tasks(self):
+        self.assertEqual([row[3] for row in gradebook.solution_rows([self.second])], ['Вторая'])
+
+    def test_pivot_cells(self):
+        rows = self.read(gradebook.export(pivot=True))
+        self.assertEqual(rows, [
+            ['Логин', 'Фамилия', 'Имя', 'Вторая', 'Первая'],
+            ['ivanov', 'Иванов', 'Иван', 'не решена', 'зачтена'],
+            ['petrov', 'Петров', 'Пётр', '', 'решена'],
+            ['sidorov', '', '', '', ''],
+        ])
+
+    def test_view_streams_csv(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get('/gradebook/', {'task': self.first.pk, 'layout': 'pivot'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="gradebook-pivot.csv"')
+        rows = self.read(chunk.decode('utf8') for chunk in response.streaming_content)
+        self.assertEqual(rows[0], ['Логин', 'Фамилия', 'Имя', 'Первая'])
+
+    def test_view_is_forbidden_for_students(self):
+        student = User.objects.create(username='staff_student', is_student=True, is_staff=True)
+        self.client.force_login(student)
+        self.assertEqual(self.client.get('/gradebook/').status_code, 403)
@@ -0,0 +1,28 @@
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from uts import local_sandbox
+
+LIMITS = {'cputime': 2, 'realtime': 1, 'memory': 256, 'processes': 5}
+
+
+@override_settings(LOCAL_SANDBOX_ISOLATE_NETWORK=0)
+class LocalSandboxTests(SimpleTestCase):
+    def test_output_and_exit_code(self):
+        report = local_sandbox.run('echo out; echo err >&2; exit 3', [], LIMITS)
+        self.assertEqual((report['stdout'], report['stderr'], report['exit_code']), (b'out\n', b'err\n', 3))
+        self.assertFalse(report['timeout'] or report['oom_killed'])
+
+    def test_output_size_counts_what_was_not_kept(self):
+        with override_settings(SANDBOX_OUTPUT_CAPTURE_LIMIT=1024):
+            report = local_sandbox.run('head -c 100000 /dev/zero', [], LIMITS)
+        self.assertLess(len(report['stdout']), 2048)
+        self.assertEqual(report['output_size'], 100000)
+
+    def test_deadline_holds_after_output_is_closed(self):
+        started_at = time.monotonic()
+        report = local_sandbox.run('exec >&- 2>&-; sleep 30', [], LIMITS)
+        self.assertLess(time.monotonic() - started_at, 10)
+        self.assertTrue(report['timeout'])
+        self.assertIsNone(report['exit_code'])
@@ -0,0 +1,52 @@
+from django.test import SimpleTestCase
+
+from uts import output, reports
+
+
+class CaptureTests(SimpleTestCase):
+    def test_small_output_is_kept(self):
+        capture = output.Capture(100)
+        for chunk in (b'abc', b'def'):
+            self.assertEqual(capture.write(chunk), chunk)
+        self.assertEqual(capture.getvalue(), b'abcdef')
+
+    def test_head_and_tail_are_kept(self):
+        capture = output.Capture(20)
+        data = bytes(range(65, 65 + 50))
+        for i in range(0, len(data), 7):
+            capture.write(data[i:i + 7])
+        value = capture.getvalue()
+        self.assertTrue(value.startswith(data[:10]))
+        self.assertTrue(value.endswith(data[-10:]))
+        self.assertIn('пропущено байт: 30'.encode('utf8'), value)
+        self.assertEqual(capture.size, 50)
+
+    def test_write_returns_the_head_part(self):
+        capture = output.Capture(20)
+        self.assertEqual(capture.write(b'x' * 8), b'x' * 8)
+        self.assertEqual(capture.write(b'y' * 8), b'yy')
+        self.assertEqual(capture.write(b'z'), b'')
+
+    def test_summary_survives_large_output(self):
+        summary = '##uts-summary## {"cases": [{"name": "1", "status": "passed", "duration": 0}]}\n'
+        data = b'spam\n' * 100000 + summary.encode()
+        stdout = output.capture(data, 64 * 1024).decode('utf8', 'replace')
+        self.assertEqual([case['name'] for case in reports.parse(stdout, '')], ['1'])
+
+
+class HeadTailTests(SimpleTestCase):
+    def test_short_text_is_kept(self):
+        self.assertEqual(output.head_tail('abc', 3), ('abc', False))
+
+    def test_long_text_keeps_head_and_tail(self):
+        text, truncated = output.head_tail('a' * 10 + 'b' * 10 + 'c' * 11, 20)
+        self.assertTrue(truncated)
+        self.assertTrue(text.startswith('a' * 10 + '\n'))
+        self.assertTrue(text.endswith('\n' + 'c' * 10))
+        self.assertIn('пропущено символов: 11', text)
+        self.assertNotIn('b', text)
+
+    def test_compressed_log_round_trip(self):
+        log = output.compress('solution-1', 'вывод\n' * 1000)
+        with output.open_log(log) as f:
+            self.assertEqual(f.read().decode('utf8'), 'вывод\n' * 1000)
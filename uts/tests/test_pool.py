@@ -0,0 +1,116 @@
+import io
+import tarfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from uts import pool
+
+
+class TarStreamTests(SimpleTestCase):
+    def read_archive(self, files):
+        return tarfile.open(fileobj=io.BytesIO(b''.join(pool._tar_stream(files))))
+
+    def test_files_and_modes(self):
+        archive = self.read_archive([
+            {'name': 'main.py', 'content': b'print(1)\n'},
+            {'name': 'solution', 'content': b'\x7fELF', 'mode': 0o755},
+        ])
+        self.assertEqual(archive.getnames(), ['main.py', 'solution'])
+        self.assertEqual(archive.extractfile('main.py').read(), b'print(1)\n')
+        self.assertEqual(archive.getmember('main.py').mode, 0o644)
+        self.assertEqual(archive.getmember('solution').mode, 0o755)
+
+    def test_sizes_at_block_boundaries(self):
+        contents = [b'', b'x' * tarfile.BLOCKSIZE, b'y' * (tarfile.BLOCKSIZE + 1)]
+        archive = self.read_archive([{'name': f'f{i}', 'content': content} for i, content in enumerate(contents)])
+        self.assertEqual([archive.extractfile(f'f{i}').read() for i in range(3)], contents)
+
+    def test_archive_is_padded_to_blocks(self):
+        data = b''.join(pool._tar_stream([{'name': 'a', 'content': b'abc'}]))
+        self.assertEqual(len(data) % tarfile.BLOCKSIZE, 0)
+
+
+class FakeRedis:
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.hashes) if key.startswith(pattern.rstrip('*').encode())]
+
+    def hgetall(self, key):
+        return self.hashes[key]
+
+    def delete(self, key):
+        del self.hashes[key]
+
+
+class PoolStatsCommandTests(SimpleTestCase):
+    def test_stats_are_printed_and_reset(self):
+        client = FakeRedis({
+            (pool.STATS_KEY_PREFIX + 'python:latest').encode(): {b'hits': b'3', b'misses': b'1', b'wait_seconds': b'2'},
+        })
+        out = io.StringIO()
+        with mock.patch.object(pool, 'get_redis', return_value=client):
+            call_command('sandbox_pool_stats', '--reset', stdout=out)
+            self.assertIn('python:latest: hits=3 misses=1 hit_ratio=75.00%', out.getvalue())
+            self.assertEqual(client.hashes, {})
+            call_command('sandbox_pool_stats', stdout=out)
+        self.assertIn('Статистика пула пуста', out.getvalue())
+
+
+class FakeContainer:
+    id = name = 'container'
+
+    def __init__(self, exit_code, oom_killed=False):
+        self.client = self
+        self.api = self
+        self.exit_code = exit_code
+        self.attrs = {'State': {'OOMKilled': oom_killed}}
+        self.command = None
+
+    def update(self, **limits):
+        pass
+
+    def put_archive(self, container_id, path, data):
+        b''.join(data)
+
+    def exec_create(self, container_id, command, workdir):
+        self.command = command
+        return {'Id': 'exec'}
+
+    def exec_start(self, exec_id, stream, demux):
+        yield b'out', None
+
+    def exec_inspect(self, exec_id):
+        return {'ExitCode': self.exit_code}
+
+    def reload(self):
+        pass
+
+
+class ExecReportTests(SimpleTestCase):
+    limits = {'cputime': 2, 'realtime': 10, 'memory': 64}
+
+    def run_exec(self, container):
+        sandbox = pool.SandboxPool.__new__(pool.SandboxPool)
+        return sandbox._exec(container, 'python3 main.py', [], self.limits)
+
+    def test_cpu_limit_leaves_a_second_before_sigkill(self):
+        container = FakeContainer(0)
+        report = self.run_exec(container)
+        self.assertIn('ulimit -S -t 2; ulimit -H -t 3;', container.command[-1])
+        self.assertEqual((report['exit_code'], report['stdout'], report['output_size']), (0, b'out', 3))
+        self.assertFalse(report['timeout'] or report['oom_killed'])
+
+    def test_sigxcpu_and_sigkill_are_timeouts(self):
+        for exit_code in (pool.SIGXCPU_EXIT_CODE, pool.SIGKILL_EXIT_CODE):
+            report = self.run_exec(FakeContainer(exit_code))
+            self.assertTrue(report['timeout'])
+            self.assertFalse(report['oom_killed'])
+
+    def test_oom_kill_of_the_container(self):
+        report = self.run_exec(FakeContainer(pool.SIGKILL_EXIT_CODE, oom_killed=True))
+        self.assertTrue(report['oom_killed'])
+        self.assertFalse(report['timeout'])
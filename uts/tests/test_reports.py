@@ -0,0 +1,109 @@
+import json
+
+from django.test import SimpleTestCase
+
+from uts import reports
+from uts.models import TestCaseResult
+
+
+def plainrunner_summary(cases):
+    return '##uts-summary## ' + json.dumps({'cases': cases, 'failed': False})
+
+
+class PlainrunnerTests(SimpleTestCase):
+    def test_last_summary_wins(self):
+        stdout = '\n'.join([
+            plainrunner_summary([{'name': 'old', 'status': 'passed', 'duration': 1}]),
+            'output of the solution',
+            plainrunner_summary([{'name': '1', 'status': 'passed', 'duration': 0.5},
+                                 {'name': '2', 'status': 'timeout', 'duration': 2}]),
+        ])
+        cases = reports.parse(stdout, '')
+        self.assertEqual([(case['name'], case['status'], case['duration']) for case in cases],
+                         [('1', TestCaseResult.PASSED, 0.5), ('2', TestCaseResult.TIMEOUT, 2)])
+
+    def test_unknown_status_is_an_error(self):
+        cases = reports.parse(plainrunner_summary([{'name': '1', 'status': 'weird'}]), '')
+        self.assertEqual(cases[0]['status'], TestCaseResult.ERROR)
+        self.assertIsNone(cases[0]['duration'])
+
+    def test_broken_summary(self):
+        self.assertEqual(reports.parse('##uts-summary## {not json', ''), [])
+
+
+class JUnitTests(SimpleTestCase):
+    def test_statuses(self):
+        stdout = '''noise
+<testsuite name="s">
+  <testcase classname="Main" name="ok" time="0.1"/>
+  <testcase classname="Main" name="bad" time="x"><failure message="expected 4">trace</failure></testcase>
+  <testcase classname="Main" name="skip"><skipped/></testcase>
+</testsuite>
+'''
+        cases = reports.parse(stdout, '')
+        self.assertEqual([(case['name'], case['status']) for case in cases], [
+            ('Main.ok', TestCaseResult.PASSED), ('Main.bad', TestCaseResult.FAILED), ('Main.skip', TestCaseResult.SKIPPED),
+        ])
+        self.assertEqual(cases[0]['duration'], 0.1)
+        self.assertIsNone(cases[1]['duration'])
+        self.assertEqual(cases[1]['output'], 'expected 4\ntrace')
+
+
+class GTestTests(SimpleTestCase):
+    def test_output_between_run_and_result(self):
+        stdout = '''[ RUN      ] Add.Works
+[       OK ] Add.Works (3 ms)
+[ RUN      ] Add.Negative
+main.cpp:10: Failure
+[  FAILED  ] Add.Negative (12 ms)
+'''
+        cases = reports.parse(stdout, '')
+        self.assertEqual([(case['name'], case['status'], case['duration']) for case in cases], [
+            ('Add.Works', TestCaseResult.PASSED, 0.003), ('Add.Negative', TestCaseResult.FAILED, 0.012),
+        ])
+        self.assertEqual(cases[1]['output'], 'main.cpp:10: Failure')
+
+
+UNITTEST_SEPARATOR = '=' * 70
+UNITTEST_LINE = '-' * 70
+
+
+class UnittestTests(SimpleTestCase):
+    def test_verbose(self):
+        stderr = f'''test_add (tests.MainTestCase) ... ok
+test_sub (tests.MainTestCase) ... FAIL
+test_mul (tests.MainTestCase) ... skipped 'later'
+
+{UNITTEST_SEPARATOR}
+FAIL: test_sub (tests.MainTestCase)
+{UNITTEST_LINE}
+AssertionError: 1 != 0
+
+{UNITTEST_LINE}
+Ran 3 tests in 0.001s
+'''
+        cases = reports.parse('', stderr)
+        self.assertEqual([(case['name'], case['status']) for case in cases], [
+            ('tests.MainTestCase.test_add', TestCaseResult.PASSED),
+            ('tests.MainTestCase.test_sub', TestCaseResult.FAILED),
+            ('tests.MainTestCase.test_mul', TestCaseResult.SKIPPED),
+        ])
+        self.assertEqual(cases[1]['output'], 'AssertionError: 1 != 0')
+
+    def test_failures_only(self):
+        stderr = f'''.E
+{UNITTEST_SEPARATOR}
+ERROR: test_div (tests.MainTestCase)
+{UNITTEST_LINE}
+ZeroDivisionError
+
+{UNITTEST_LINE}
+Ran 2 tests in 0.001s
+'''
+        cases = reports.parse('', stderr)
+        self.assertEqual([(case['name'], case['status']) for case in cases],
+                         [('tests.MainTestCase.test_div', TestCaseResult.ERROR)])
+
+    def test_output_is_truncated(self):
+        cases = reports.parse(plainrunner_summary([{'name': 'x' * 600, 'status': 'passed'}]), '')
+        self.assertEqual(len(cases[0]['name']), 512)
@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from uts import similarity
+from uts.models import Environment, SimilarityMatch, Solution, Task, User
+
+SOURCE = '''
+def average(values):
+    # Mean of a list
+    total = 0
+    for value in values:
+        total += value
+    return total / len(values)
+
+
+def main():
+    numbers = [int(x) for x in input().split()]
+    print("average:", average(numbers))
+    print(max(numbers) - min(numbers))
+'''
+
+RENAMED = '''
+def mean(xs):
+    s = 0
+    for x in xs:
+        s += x
+    return s / len(xs)
+
+
+def main():
+    data = [int(t) for t in input().split()]
+    print('mean', mean(data))
+    print(max(data) - min(data))
+'''
+
+OTHER = '''
+import sys
+
+lines = sys.stdin.read().splitlines()
+counts = {}
+while lines:
+    line = lines.pop()
+    if line in counts:
+        counts[line] = counts[line] + 1
+    else:
+        counts[line] = 1
+for key, count in sorted(counts.items()):
+    print(key, count)
+'''
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_names_numbers_and_strings_are_replaced(self):
+        tokens = list(similarity.tokenize('if total > 10: print("big")  # comment'))
+        self.assertEqual(tokens, ['if', 'N', '>', 'N', ':', 'N', '(', 'S', ')'])
+
+    def test_renamed_copy_has_the_same_fingerprint(self):
+        self.assertEqual(similarity.fingerprint(SOURCE), similarity.fingerprint(RENAMED))
+
+    def test_different_solutions_are_not_similar(self):
+        first, second = set(similarity.fingerprint(SOURCE)), set(similarity.fingerprint(OTHER))
+        self.assertLess(similarity.jaccard(first, second), 0.2)
+
+    def test_bands_of_equal_fingerprints_are_equal(self):
+        hashes = similarity.fingerprint(SOURCE)
+        values = similarity.bands(hashes)
+        self.assertEqual(len(values), similarity.BANDS)
+        self.assertEqual(values, similarity.bands(similarity.fingerprint(RENAMED)))
+        self.assertEqual(similarity.bands([]), [])
+
+    def test_pack_round_trip(self):
+        hashes = similarity.fingerprint(SOURCE)
+        self.assertEqual(list(similarity.unpack(similarity.pack(hashes))), hashes)
+
+    def test_jaccard(self):
+        self.assertEqual(similarity.jaccard({1, 2, 3}, {2, 3, 4}), 0.5)
+        self.assertEqual(similarity.jaccard(set(), {1}), 0.0)
+
+
+class IndexTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.task = Task.objects.create(
+            name='Task', description='', environment=Environment.objects.get(name='Pure Python'),
+            tests_file=ContentFile(b'tests', name='tests.py'),
+        )
+
+    def upload(self, username, source):
+        author, _ = User.objects.get_or_create(username=username, defaults={'is_student': True})
+        return Solution.objects.create(
+            author=author, task=self.task, solution_file=ContentFile(source.encode(), name='main.py'),
+            created_at=timezone.now(),
+        )
+
+    def test_copies_of_other_students_are_matched(self):
+        original = self.upload('first', SOURCE)
+        self.assertEqual(similarity.index_solution(original), 0)
+        self.assertEqual(similarity.index_solution(self.upload('second', OTHER)), 0)
+        copy = self.upload('third', RENAMED)
+        self.assertEqual(similarity.index_solution(copy), 1)
+        match = similarity.similar_to(original).get()
+        self.assertEqual((match.solution, match.other, match.similarity), (copy, original, 1.0))
+        # Indexing again does not duplicate the match
+        self.assertEqual(similarity.index_solution(copy), 0)
+
+    def test_own_solutions_are_not_matched(self):
+        similarity.index_solution(self.upload('first', SOURCE))
+        self.assertEqual(similarity.index_solution(self.upload('first', RENAMED)), 0)
+        self.assertFalse(SimilarityMatch.objects.exists())
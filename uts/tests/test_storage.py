@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from uts import storage
+from uts.models import Blob, Environment, Solution, Task, User
+
+
+class StorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.task = Task.objects.create(
+            name='Task', description='', environment=Environment.objects.get(name='Pure Python'),
+            tests_file=ContentFile(b'tests', name='tests.py'),
+        )
+        self.author = User.objects.create(username='student', is_student=True)
+
+    def upload(self, content):
+        return Solution.objects.create(
+            author=self.author, task=self.task, solution_file=ContentFile(content, name='main.py'),
+            created_at=timezone.now(),
+        )
+
+    def blob(self, content):
+        return Blob.objects.get(digest=storage.file_digest(ContentFile(content, name='main.py'), content))
+
+    def test_name_is_the_digest(self):
+        solution = self.upload(b'print(1)')
+        digest = storage.digest(solution.solution_file.name)
+        self.assertEqual(solution.solution_file.name, storage.blob_name(digest))
+        self.assertEqual(storage.file_digest(solution.solution_file), digest)
+        self.assertIsNone(storage.digest('solutions/main.py'))
+
+    def test_same_content_is_stored_once(self):
+        first, second = self.upload(b'print(1)'), self.upload(b'print(1)')
+        self.assertEqual(first.solution_file.name, second.solution_file.name)
+        blob = self.blob(b'print(1)')
+        self.assertEqual((blob.size, blob.references), (8, 2))
+
+    def test_references_follow_rows(self):
+        solution = self.upload(b'old')
+        solution.solution_file = ContentFile(b'new', name='main.py')
+        solution.save()
+        self.assertEqual(self.blob(b'old').references, 0)
+        self.assertEqual(self.blob(b'new').references, 1)
+        solution.delete()
+        self.assertEqual(self.blob(b'new').references, 0)
+
+    def test_collect_garbage_removes_unreferenced_blobs(self):
+        kept = self.upload(b'kept')
+        removed = self.upload(b'removed')
+        path = storage.blob_storage.path(removed.solution_file.name)
+        removed.delete()
+        # Fresh blobs are kept: their rows may not be committed yet
+        self.assertEqual(storage.collect_garbage(), (0, 0))
+        Blob.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(storage.collect_garbage(dry_run=True), (1, 7))
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(storage.collect_garbage(), (1, 7))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.filter(digest=storage.digest(removed.solution_file.name)).exists())
+        self.assertTrue(os.path.exists(storage.blob_storage.path(kept.solution_file.name)))
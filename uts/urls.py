@@ -1,7 +1,9 @@
 from .admin import admin_site
+from .views import metrics_view
 from django.urls import path
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     path('', admin_site.urls),
 ]
 
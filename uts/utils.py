@@ -1,17 +1,43 @@
 import logging
 
+import redis
+from django.conf import settings
 from django.contrib.auth.models import Group, Permission
 
+STUDENT_GROUP_NAME = 'Студенты'
+STUDENT_MODELS = ('task', 'solution', 'testcaseresult')
+
+_student_group = None
+_redis_clients = {}
+
+
+def setup_student_group():
+    group, _ = Group.objects.get_or_create(name=STUDENT_GROUP_NAME)
+    codenames = [f'view_{model_name}' for model_name in STUDENT_MODELS]
+    permissions = list(Permission.objects.filter(content_type__app_label='uts', codename__in=codenames))
+    for codename in set(codenames) - {permission.codename for permission in permissions}:
+        logging.warning(f"Permission not found with codename '{codename}'.")
+    group.permissions.set(permissions)
+    return group
+
 
 def get_student_group():
-    group, _ = Group.objects.get_or_create(name='Студенты')
-    group.permissions.clear()
-    for model_name in ('task', 'solution'):
-        codename = f'view_{model_name}'
+    global _student_group
+    if _student_group is None:
         try:
-            model_view_perm = Permission.objects.get(codename=codename)
-        except Permission.DoesNotExist:
-            logging.warning(f"Permission not found with codename '{codename}'.")
-            continue
-        group.permissions.add(model_view_perm)
-    return group
+            _student_group = Group.objects.get(name=STUDENT_GROUP_NAME)
+        except Group.DoesNotExist:
+            _student_group = setup_student_group()
+    return _student_group
+
+
+def reset_student_group_cache():
+    global _student_group
+    _student_group = None
+
+
+def get_redis(decode_responses=False):
+    """Redis client of the process, shared by every module that keeps state in Redis."""
+    if decode_responses not in _redis_clients:
+        _redis_clients[decode_responses] = redis.Redis.from_url(settings.REDIS_URL, decode_responses=decode_responses)
+    return _redis_clients[decode_responses]
@@ -0,0 +1,11 @@
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from uts import metrics
+
+
+@require_GET
+def metrics_view(request):
+    if not metrics.is_request_allowed(request.headers.get('Authorization')):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)